@@ -0,0 +1,37 @@
+import io
+import re
+
+import msgpack
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+
+# Числа из 19 и более цифр могут не поместиться в 64 бита, и orjson прочитал бы их как float
+LONG_NUMBER = re.compile(rb'\d{19,}')
+
+
+class ORJSONParser(JSONParser):
+    """JSON через orjson. Тело с длинными числами разбирается JSONParser, чтобы целые числа вне 64 бит не
+    превращались в float."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        body = stream.read()
+        if LONG_NUMBER.search(body):
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackParser(BaseParser):
+    """MessagePack для клиентов, передающих Content-Type: application/msgpack."""
+
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (TypeError, ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
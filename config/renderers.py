@@ -0,0 +1,84 @@
+import datetime
+import uuid
+from decimal import Decimal
+
+import msgpack
+import orjson
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def default(obj):
+    """Функция приводит типы, которые не поддерживаются orjson и msgpack, к тем же значениям, что и
+    rest_framework.utils.encoders.JSONEncoder. Decimal и целые числа вне 64 бит (только в msgpack) передаются
+    строкой без потери точности."""
+
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, int):
+        # msgpack передает сюда целые числа вне 64 бит, они кодируются строкой, как Decimal
+        return str(obj)
+    if isinstance(obj, Promise):
+        return force_str(obj)
+    if isinstance(obj, datetime.datetime):
+        representation = obj.isoformat()
+        if representation.endswith('+00:00'):
+            representation = representation[:-6] + 'Z'
+        return representation
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, '__getitem__'):
+        try:
+            return dict(obj)
+        except (TypeError, ValueError):
+            pass
+    if hasattr(obj, '__iter__'):
+        return list(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not serializable')
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSON через orjson. Заменяет JSONRenderer, поэтому с ним работает и BrowsableAPIRenderer."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        options = ORJSON_OPTIONS
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            options |= orjson.OPT_INDENT_2
+        try:
+            ret = orjson.dumps(data, default=default, option=options)
+        except orjson.JSONEncodeError:
+            # orjson не кодирует целые числа вне 64 бит, JSONRenderer кодирует их без потери точности
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Как и JSONRenderer, экранируем разделители строк, недопустимые в JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack для клиентов, передающих Accept: application/msgpack."""
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=default, datetime=False)
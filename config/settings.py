@@ -169,7 +169,7 @@ SIMPLE_JWT = {
 
     "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
     "TOKEN_TYPE_CLAIM": "token_type",
-    "TOKEN_USER_CLASS": "rest_framework_simplejwt.models.TokenUser",
+    "TOKEN_USER_CLASS": "users.authentication.ClaimsTokenUser",
 
     "JTI_CLAIM": "jti",
 
@@ -177,7 +177,7 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 
-    "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.UserTokenObtainPairSerializer",
     "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
@@ -208,6 +208,22 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'config.renderers.ORJSONRenderer',
+        'config.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'config.parsers.ORJSONParser',
+        'config.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    'TEST_REQUEST_RENDERER_CLASSES': (
+        'rest_framework.renderers.MultiPartRenderer',
+        'config.renderers.ORJSONRenderer',
+        'config.renderers.MessagePackRenderer',
+    ),
 }
 
 SWAGGER_SETTINGS = {
@@ -234,6 +250,94 @@ CELERY_RESULT_BACKEND = os.getenv('LOCATION')
 CELERY_TIMEZONE = 'Australia/Tasmania'
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
-CELERY_TASK_ALWAYS_EAGER = True
+# Задачи выполняются воркерами Celery, а не в процессе веб-сервера. Для локальной отладки без брокера можно
+# установить CELERY_TASK_ALWAYS_EAGER=True
+CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER', 'False') == 'True'
+# Курсы обновляются чаще, чем истекает RATE_CACHE_TTL, поэтому запросы пользователей не ждут apilayer
+CELERY_BEAT_SCHEDULE = {
+    'refresh-currency-rates': {
+        'task': 'converter.tasks.refresh_currency_rates',
+        'schedule': int(os.getenv('RATE_REFRESH_INTERVAL', 240)),
+    },
+    'create-rate-history-partitions': {
+        'task': 'converter.tasks.create_rate_history_partitions',
+        'schedule': 24 * 60 * 60,
+    },
+}
+
+if os.getenv('LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('LOCATION'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
 
 API_KEY = os.getenv('API_KEY')
+
+# Актуальные валюты и опорная валюта, относительно которой apilayer возвращает матрицу курсов
+RATE_CURRENCIES = ('GBP', 'USD', 'EUR', 'CNY')
+RATE_MATRIX_PIVOT = os.getenv('RATE_MATRIX_PIVOT', 'EUR')
+
+# Провайдер курсов валют: converter.providers.ApilayerRateProvider или converter.providers.FakeRateProvider.
+# Для работы без сети RATE_PROVIDER_URL можно направить на сервер-заглушку (python manage.py rate_stub_server)
+RATE_PROVIDER_BACKEND = os.getenv('RATE_PROVIDER_BACKEND', 'converter.providers.ApilayerRateProvider')
+RATE_PROVIDER_FAKE_LATENCY = float(os.getenv('RATE_PROVIDER_FAKE_LATENCY', 0))
+
+# Клиент apilayer: таймауты подключения и чтения в секундах, число повторов и размер пула соединений
+RATE_PROVIDER_URL = os.getenv('RATE_PROVIDER_URL', 'https://api.apilayer.com/exchangerates_data/latest')
+RATE_PROVIDER_CONNECT_TIMEOUT = float(os.getenv('RATE_PROVIDER_CONNECT_TIMEOUT', 3.05))
+RATE_PROVIDER_READ_TIMEOUT = float(os.getenv('RATE_PROVIDER_READ_TIMEOUT', 10))
+RATE_PROVIDER_RETRIES = int(os.getenv('RATE_PROVIDER_RETRIES', 2))
+RATE_PROVIDER_BACKOFF = float(os.getenv('RATE_PROVIDER_BACKOFF', 0.5))
+RATE_PROVIDER_POOL_SIZE = int(os.getenv('RATE_PROVIDER_POOL_SIZE', 10))
+
+# Предохранитель провайдера курсов: число неудач подряд до размыкания и время до пробного запроса в секундах
+RATE_BREAKER_FAILURE_THRESHOLD = int(os.getenv('RATE_BREAKER_FAILURE_THRESHOLD', 5))
+RATE_BREAKER_RESET_TIMEOUT = int(os.getenv('RATE_BREAKER_RESET_TIMEOUT', 30))
+
+# Кэш курсов валют: время жизни записи и окно, в течение которого отдается устаревшее значение
+RATE_CACHE_ALIAS = 'default'
+RATE_CACHE_TTL = int(os.getenv('RATE_CACHE_TTL', 300))
+RATE_CACHE_STALE = int(os.getenv('RATE_CACHE_STALE', 600))
+
+# Объединение одновременных запросов к apilayer: converter.singleflight.SingleFlight — внутри процесса,
+# converter.singleflight.RedisSingleFlight — дополнительно между воркерами через блокировку в Redis
+RATE_SINGLEFLIGHT_BACKEND = os.getenv('RATE_SINGLEFLIGHT_BACKEND', 'converter.singleflight.SingleFlight')
+RATE_SINGLEFLIGHT_LOCK_TIMEOUT = int(os.getenv('RATE_SINGLEFLIGHT_LOCK_TIMEOUT', 30))
+RATE_SINGLEFLIGHT_WAIT_TIMEOUT = int(os.getenv('RATE_SINGLEFLIGHT_WAIT_TIMEOUT', 30))
+
+# Максимальное число конвертаций в одном запросе к converter/get_rate/batch/
+RATE_BATCH_MAX_SIZE = int(os.getenv('RATE_BATCH_MAX_SIZE', 1000))
+
+# Скомпилированные таблицы курсов пользователей: размер LRU процесса, время жизни записи LRU и общего кэша в
+# секундах и канал Redis pub/sub для рассылки новых версий таблиц
+RATE_TABLE_L1_SIZE = int(os.getenv('RATE_TABLE_L1_SIZE', 10000))
+RATE_TABLE_L1_TIMEOUT = int(os.getenv('RATE_TABLE_L1_TIMEOUT', 60))
+RATE_TABLE_TIMEOUT = int(os.getenv('RATE_TABLE_TIMEOUT', 3600))
+RATE_TABLE_CHANNEL = os.getenv('RATE_TABLE_CHANNEL', 'rate_table')
+
+# История курсов валют: на сколько месяцев вперед создаются секции таблицы (только PostgreSQL) и максимальное
+# число точек в ответе converter/history/
+RATE_HISTORY_PARTITIONS_AHEAD = int(os.getenv('RATE_HISTORY_PARTITIONS_AHEAD', 3))
+RATE_HISTORY_MAX_POINTS = int(os.getenv('RATE_HISTORY_MAX_POINTS', 5000))
+
+# Время в секундах, через которое ряд курсов пары валют для конвертации на дату заново выбирается из базы данных
+# (между выборками ряд хранится в процессе и дополняется новыми точками)
+RATE_SERIES_TIMEOUT = int(os.getenv('RATE_SERIES_TIMEOUT', 24 * 60 * 60))
+
+# Количество строк файла, конвертируемых за один вызов векторной конвертации в converter/convert/bulk/. Для
+# фоновой конвертации файлов (converter/jobs/) это также количество строк на странице результатов
+RATE_BULK_CHUNK_SIZE = int(os.getenv('RATE_BULK_CHUNK_SIZE', 10000))
+
+# Время жизни закэшированной страницы списка пользователей (user/) в секундах
+USER_LIST_CACHE_TIMEOUT = int(os.getenv('USER_LIST_CACHE_TIMEOUT', 30))
+
+# Количество уже проверенных токенов в LRU процесса для users.authentication.StatelessJWTAuthentication
+JWT_STATELESS_CACHE_SIZE = int(os.getenv('JWT_STATELESS_CACHE_SIZE', 10000))
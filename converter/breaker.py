@@ -0,0 +1,83 @@
+import threading
+import time
+
+from django.conf import settings
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Исключение возбуждается, если предохранитель разомкнут и запрос к провайдеру не выполняется."""
+
+
+class CircuitBreaker:
+    """Предохранитель для запросов к провайдеру курсов валют. После <failure_threshold> неудач подряд
+    размыкается и в течение <reset_timeout> секунд сразу возбуждает CircuitOpenError, не дожидаясь таймаутов.
+    Затем пропускает один пробный запрос: при успехе замыкается, при неудаче снова размыкается."""
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        self.failure_threshold = failure_threshold or settings.RATE_BREAKER_FAILURE_THRESHOLD
+        self.reset_timeout = settings.RATE_BREAKER_RESET_TIMEOUT if reset_timeout is None else reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def call(self, fn):
+        """Метод вызывает <fn> через предохранитель. Ответ None считается неудачей. Прерванный вызов (например,
+        отмена задачи или eventlet.Timeout) тоже считается неудачей, иначе пробный запрос остался бы незавершенным и
+        предохранитель не замкнулся бы."""
+
+        self._before_call()
+        try:
+            result = fn()
+        except BaseException:
+            self._record(success=False)
+            raise
+        self._record(success=result is not None)
+        return result
+
+    async def acall(self, afn):
+        """Асинхронный вариант call."""
+
+        self._before_call()
+        try:
+            result = await afn()
+        except BaseException:
+            self._record(success=False)
+            raise
+        self._record(success=result is not None)
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._state, self._failures, self._probing = CLOSED, 0, False
+
+    def _before_call(self):
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpenError('Сервер для получение курса валют недоступен.')
+
+    def _record(self, success):
+        with self._lock:
+            self._probing = False
+            if success:
+                self._state, self._failures = CLOSED, 0
+                return
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state, self._opened_at = OPEN, time.monotonic()
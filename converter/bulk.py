@@ -0,0 +1,106 @@
+import codecs
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+
+from converter.money import CURRENCIES, Money, convert_minor_array, scale_rate
+
+FIELDS = ('base_currency', 'target_currency', 'amount')
+RESULT_FIELDS = (*FIELDS, 'converted', 'error')
+
+WRONG_CODE = 'Необходимо использовать только актуальные курсы валют.'
+WRONG_AMOUNT = 'Сумма должна быть числом.'
+NO_CONVERTER = 'Пользователь не добавил текущую валюту для конвертации.'
+
+
+class Echo:
+    """Буфер для csv.writer, который возвращает записанную строку вместо ее хранения."""
+
+    def write(self, value):
+        return value
+
+
+def read_rows(file, fmt):
+    """Функция построчно читает загруженный файл <file> в формате csv или ndjson и возвращает генератор словарей.
+    Файл не читается в память целиком."""
+
+    lines = codecs.iterdecode(file, 'utf-8-sig')
+    if fmt == 'csv':
+        yield from csv.DictReader(lines)
+        return
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield row if isinstance(row, dict) else {}
+
+
+def convert_chunk(rows, rates):
+    """Функция конвертирует пачку строк по курсам пользователя <rates> {(base, target): курс с RATE_SCALE}.
+    Строки группируются по паре валют, каждая группа конвертируется одним вызовом convert_minor_array."""
+
+    results = []
+    groups = {}
+    for row in rows:
+        base = str(row.get('base_currency') or '').upper()
+        target = str(row.get('target_currency') or '').upper()
+        result = {'base_currency': base, 'target_currency': target, 'amount': row.get('amount'), 'converted': None,
+                  'error': None}
+        results.append(result)
+
+        if base not in CURRENCIES or target not in CURRENCIES:
+            result['error'] = WRONG_CODE
+            continue
+        if (base, target) not in rates:
+            result['error'] = NO_CONVERTER
+            continue
+        try:
+            minor = Money.from_decimal(Decimal(str(row.get('amount'))), base).minor
+        except (InvalidOperation, ValueError):
+            result['error'] = WRONG_AMOUNT
+            continue
+        indexes, minors = groups.setdefault((base, target), ([], []))
+        indexes.append(len(results) - 1)
+        minors.append(minor)
+
+    for (base, target), (indexes, minors) in groups.items():
+        target_currency = CURRENCIES[target]
+        converted = convert_minor_array(minors, rates[base, target], CURRENCIES[base], target_currency)
+        for index, minor in zip(indexes, converted.tolist()):
+            results[index]['converted'] = str(Money(minor, target_currency).to_decimal())
+    return results
+
+
+def convert_rows(rows, rates, chunk_size=None):
+    """Функция конвертирует строки пачками по <chunk_size> и возвращает генератор пачек результатов. Курсы
+    пользователя <rates> {(base, target): Decimal} переводятся в целые числа один раз."""
+
+    chunk_size = chunk_size or settings.RATE_BULK_CHUNK_SIZE
+    scaled_rates = {pair: scale_rate(rate) for pair, rate in rates.items()}
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        yield convert_chunk(chunk, scaled_rates)
+
+
+def render_csv(chunks):
+    writer = csv.writer(Echo())
+    yield writer.writerow(RESULT_FIELDS)
+    for chunk in chunks:
+        yield ''.join(writer.writerow([result[field] for field in RESULT_FIELDS]) for result in chunk)
+
+
+def render_ndjson(chunks):
+    for chunk in chunks:
+        yield ''.join(json.dumps(result, ensure_ascii=False) + '\n' for result in chunk)
+
+
+RENDERERS = {
+    'csv': (render_csv, 'text/csv'),
+    'ndjson': (render_ndjson, 'application/x-ndjson'),
+}
@@ -0,0 +1,189 @@
+import asyncio
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+_redis_clients = {}
+_redis_lock = threading.Lock()
+
+
+def get_redis_client(alias):
+    """Функция возвращает клиент Redis для кэша <alias> или None, если кэш хранится не в Redis. Клиент и его пул
+    соединений создаются один раз на процесс (после fork — заново)."""
+
+    params = settings.CACHES[alias]
+    if 'redis' not in params['BACKEND'].lower():
+        return None
+    key = (alias, os.getpid())
+    with _redis_lock:
+        if key not in _redis_clients:
+            import redis
+            _redis_clients[key] = redis.Redis.from_url(params['LOCATION'])
+        return _redis_clients[key]
+
+
+class RateCache:
+    """Кэш курсов валют поверх кэш-фреймворка Django. Ключом является пара (<base>, <symbols>). Запись считается
+    свежей в течение <ttl> секунд, после чего еще <stale> секунд отдается устаревшее значение, а обновление
+    выполняется в фоне (stale-while-revalidate). Одновременные промахи по одному ключу объединяются в один запрос
+    к apilayer (single-flight)."""
+
+    def __init__(self, alias=None, ttl=None, stale=None, prefix='currency_rate', flight=None):
+        self.alias = alias or settings.RATE_CACHE_ALIAS
+        self.ttl = settings.RATE_CACHE_TTL if ttl is None else ttl
+        self.stale = settings.RATE_CACHE_STALE if stale is None else stale
+        self.prefix = prefix
+        self.flight = flight or import_string(settings.RATE_SINGLEFLIGHT_BACKEND)()
+        self._lock = threading.Lock()
+        self._revalidating = set()
+        self._tasks = set()
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'revalidations': 0}
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def make_key(self, base, symbols):
+        """Метод возвращает ключ кэша для пары (<base>, <symbols>)."""
+
+        return f'{self.prefix}:{base.upper()}:{",".join(sorted(symbols))}'
+
+    def get_or_fetch(self, base, symbols, fetch):
+        """Метод возвращает курсы из кэша, а при их отсутствии вызывает <fetch> и сохраняет результат."""
+
+        entry = self.get_or_fetch_entry(base, symbols, fetch)
+        return entry['rates'] if entry else None
+
+    def get_or_fetch_entry(self, base, symbols, fetch):
+        """Метод возвращает запись кэша {'rates': ..., 'fetched_at': ...} или None, если курсы не получены."""
+
+        key = self.make_key(base, symbols)
+        entry = self.cache.get(key)
+
+        if entry is not None:
+            age = time.time() - entry['fetched_at']
+            if age < self.ttl:
+                self._incr('hits')
+                return entry
+            if age < self.ttl + self.stale:
+                self._incr('stale_hits')
+                self._revalidate(key, fetch)
+                return entry
+
+        self._incr('misses')
+        return self.flight.do(key, lambda: self.set(key, fetch()))
+
+    async def aget_or_fetch(self, base, symbols, afetch):
+        """Асинхронный вариант get_or_fetch: <afetch> — корутинная функция, фоновое обновление выполняется
+        задачей в текущем цикле событий."""
+
+        entry = await self.aget_or_fetch_entry(base, symbols, afetch)
+        return entry['rates'] if entry else None
+
+    async def aget_or_fetch_entry(self, base, symbols, afetch):
+        key = self.make_key(base, symbols)
+        entry = await self.cache.aget(key)
+
+        if entry is not None:
+            age = time.time() - entry['fetched_at']
+            if age < self.ttl:
+                self._incr('hits')
+                return entry
+            if age < self.ttl + self.stale:
+                self._incr('stale_hits')
+                self._arevalidate(key, afetch)
+                return entry
+
+        self._incr('misses')
+        return await self.flight.ado(key, lambda: self._afetch_and_set(key, afetch))
+
+    def set(self, key, rates):
+        """Метод сохраняет курсы в кэш и возвращает запись кэша. Пустые ответы не кэшируются."""
+
+        if not rates:
+            return None
+        entry = {'rates': rates, 'fetched_at': time.time()}
+        self.cache.set(key, entry, timeout=self.ttl + self.stale)
+        return entry
+
+    async def aset(self, key, rates):
+        if not rates:
+            return None
+        entry = {'rates': rates, 'fetched_at': time.time()}
+        await self.cache.aset(key, entry, timeout=self.ttl + self.stale)
+        return entry
+
+    def invalidate(self, base, symbols):
+        self.cache.delete(self.make_key(base, symbols))
+
+    async def _afetch_and_set(self, key, afetch):
+        return await self.aset(key, await afetch())
+
+    def stats(self):
+        """Метод возвращает счетчики попаданий и промахов текущего процесса."""
+
+        with self._lock:
+            return dict(self._stats)
+
+    def reset_stats(self):
+        with self._lock:
+            for name in self._stats:
+                self._stats[name] = 0
+
+    def _incr(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _start_revalidation(self, key):
+        with self._lock:
+            if key in self._revalidating:
+                return False
+            self._revalidating.add(key)
+            self._stats['revalidations'] += 1
+            return True
+
+    def _finish_revalidation(self, key):
+        with self._lock:
+            self._revalidating.discard(key)
+
+    def _revalidate(self, key, fetch):
+        """Метод запускает фоновое обновление ключа, если оно еще не запущено в текущем процессе."""
+
+        if not self._start_revalidation(key):
+            return
+
+        def worker():
+            try:
+                self.set(key, fetch())
+            except Exception:
+                # Неудачное обновление оставляет в кэше устаревшее значение до конца окна <stale>
+                pass
+            finally:
+                self._finish_revalidation(key)
+
+        threading.Thread(target=worker, name='rate-cache-revalidate', daemon=True).start()
+
+    def _arevalidate(self, key, afetch):
+        """Метод запускает фоновое обновление ключа задачей в текущем цикле событий."""
+
+        if not self._start_revalidation(key):
+            return
+
+        async def worker():
+            try:
+                await self.aset(key, await afetch())
+            except Exception:
+                pass
+            finally:
+                self._finish_revalidation(key)
+
+        task = asyncio.get_running_loop().create_task(worker())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+rate_cache = RateCache()
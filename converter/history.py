@@ -0,0 +1,206 @@
+import logging
+import threading
+import time
+from bisect import bisect_right
+from datetime import date
+from decimal import Decimal
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connection as default_connection, transaction
+from django.db.models import Count, Max, Min
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from converter.matrix import RATE_QUANT
+from converter.models import RateHistory
+
+logger = logging.getLogger(__name__)
+
+# Приблизительная длительность интервалов прореживания в секундах, используется для ограничения числа точек
+INTERVAL_SECONDS = {
+    'minute': 60,
+    'hour': 60 * 60,
+    'day': 24 * 60 * 60,
+    'week': 7 * 24 * 60 * 60,
+    'month': 30 * 24 * 60 * 60,
+}
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def ensure_rate_history_partitions(start=None, months_ahead=None, connection=None):
+    """Функция создает месячные секции таблицы истории курсов с месяца <start> до <months_ahead> месяцев вперед.
+    Возвращает количество созданных секций. В СУБД, отличных от PostgreSQL, ничего не делает."""
+
+    connection = connection or default_connection
+    if connection.vendor != 'postgresql':
+        return 0
+
+    table = RateHistory._meta.db_table
+    months_ahead = settings.RATE_HISTORY_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+    today = timezone.now().date()
+    month = add_months(start or today, 0)
+    last = add_months(today, months_ahead)
+
+    created = 0
+    with connection.cursor() as cursor:
+        while month <= last:
+            partition = f'{table}_p{month:%Y%m}'
+            cursor.execute('SELECT to_regclass(%s)', [partition])
+            if cursor.fetchone()[0] is None:
+                try:
+                    with transaction.atomic(using=connection.alias):
+                        cursor.execute(
+                            f"CREATE TABLE {partition} PARTITION OF {table} "
+                            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+                        )
+                    created += 1
+                except DatabaseError:
+                    # Строки за этот месяц уже попали в секцию по умолчанию
+                    logger.warning('Не удалось создать секцию %s истории курсов.', partition, exc_info=True)
+            month = add_months(month, 1)
+    return created
+
+
+def record_rate_history(base, rates, observed_at):
+    """Функция добавляет курсы <rates> в отношение <base> в историю курсов. После фиксации транзакции версия
+    истории <base> увеличивается, и ряды курсов этих пар дополняются новыми точками при следующем обращении."""
+
+    RateHistory.objects.bulk_create(
+        (RateHistory(base=base.upper(), target=target, rate=rate, observed_at=observed_at)
+         for target, rate in rates.items()),
+        ignore_conflicts=True
+    )
+    transaction.on_commit(lambda: rate_series.invalidate(base))
+
+
+class RateSeries:
+    """Отсортированный по времени ряд курсов одной пары валют. Курс на момент времени ищется бинарным поиском."""
+
+    def __init__(self, points, times=(), rates=(), last_observed=None):
+        points = list(points)
+        self.times = [*times, *(observed_at.timestamp() for observed_at, _ in points)]
+        self.rates = [*rates, *(rate for _, rate in points)]
+        self.last_observed = points[-1][0] if points else last_observed
+
+    def __len__(self):
+        return len(self.times)
+
+    def extended(self, points):
+        """Метод возвращает новый ряд, дополненный точками <points>, которые позже последней точки ряда. Ряд не
+        изменяется, поэтому его можно читать из других потоков."""
+
+        return RateSeries(points, self.times, self.rates, self.last_observed)
+
+    def rate_at(self, as_of):
+        """Метод возвращает курс, действовавший в момент <as_of>, или None, если курсов на этот момент нет."""
+
+        index = bisect_right(self.times, as_of.timestamp()) - 1
+        return self.rates[index] if index >= 0 else None
+
+    def rates_at(self, moments):
+        """Метод возвращает курсы на моменты <moments> в исходном порядке. Моменты сортируются, и ряд проходится
+        один раз: каждый следующий поиск начинается с позиции предыдущего."""
+
+        result = [None] * len(moments)
+        position = 0
+        for index, timestamp in sorted(enumerate(moment.timestamp() for moment in moments), key=itemgetter(1)):
+            position = bisect_right(self.times, timestamp, lo=position)
+            if position:
+                result[index] = self.rates[position - 1]
+        return result
+
+
+class RateSeriesCache:
+    """Ряды курсов пар валют внутри процесса {(base, target): (version, expires, RateSeries)}.
+
+    В общем кэше хранится только версия истории каждой базовой валюты: при записи истории она увеличивается, и ряд
+    с прежней версией дополняется одним запросом лишь точками позже последней, а не выбирается из базы данных и
+    не передается по сети целиком. Ряд старше <timeout> секунд выбирается заново."""
+
+    def __init__(self, alias=None, timeout=None, prefix='rate_history'):
+        self.alias = alias or settings.RATE_CACHE_ALIAS
+        self.timeout = settings.RATE_SERIES_TIMEOUT if timeout is None else timeout
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._series = {}
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def version_key(self, base):
+        return f'{self.prefix}:version:{base.upper()}'
+
+    def get(self, base, target):
+        """Метод возвращает ряд курсов <base>/<target>."""
+
+        pair = (base.upper(), target.upper())
+        version = self.cache.get(self.version_key(base), 0)
+        with self._lock:
+            entry = self._series.get(pair)
+
+        history = RateHistory.objects.filter(base=pair[0], target=pair[1]).order_by('observed_at')
+        if entry is None or entry[1] <= time.monotonic():
+            entry = (version, time.monotonic() + self.timeout,
+                     RateSeries(history.values_list('observed_at', 'rate')))
+        elif entry[0] != version:
+            series = entry[2]
+            if series.last_observed is not None:
+                history = history.filter(observed_at__gt=series.last_observed)
+            entry = (version, entry[1], series.extended(history.values_list('observed_at', 'rate')))
+        else:
+            return entry[2]
+
+        with self._lock:
+            self._series[pair] = entry
+        return entry[2]
+
+    def invalidate(self, base):
+        """Метод увеличивает версию истории базовой валюты <base> во всех процессах."""
+
+        key = self.version_key(base)
+        self.cache.add(key, 0, None)
+        return self.cache.incr(key)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+rate_series = RateSeriesCache()
+
+
+def get_rate_series(base, target):
+    """Функция возвращает ряд курсов <base>/<target> из кэша процесса. При первом обращении ряд выбирается из базы
+    данных одним запросом, после записи истории — дополняется новыми точками."""
+
+    return rate_series.get(base, target)
+
+
+def downsample_rate_history(base, target, start, end, interval):
+    """Функция возвращает историю курса <base>/<target> за период [<start>, <end>), прореженную на стороне базы
+    данных: для каждого интервала <interval> — минимальный, максимальный и последний курс."""
+
+    history = RateHistory.objects.filter(base=base.upper(), target=target.upper(), observed_at__gte=start,
+                                         observed_at__lt=end)
+    buckets = list(
+        history.annotate(bucket=Trunc('observed_at', interval)).values('bucket').annotate(
+            min=Min('rate'), max=Max('rate'), last_at=Max('observed_at'), count=Count('id')
+        ).order_by('bucket')
+    )
+
+    # Последний курс каждого интервала выбирается одним запросом по уникальному индексу
+    last_rates = dict(history.filter(observed_at__in=[bucket['last_at'] for bucket in buckets]).values_list(
+        'observed_at', 'rate'
+    )) if buckets else {}
+    for bucket in buckets:
+        bucket['last'] = last_rates[bucket.pop('last_at')]
+        for key in ('min', 'max', 'last'):
+            bucket[key] = Decimal(bucket[key]).quantize(RATE_QUANT)
+    return buckets
@@ -0,0 +1,78 @@
+import io
+import time
+from decimal import Decimal
+
+from django.core.management import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from config.parsers import MessagePackParser, ORJSONParser
+from config.renderers import MessagePackRenderer, ORJSONRenderer
+from converter.money import CURRENCIES
+
+FORMATS = {
+    'json (DRF)': (JSONRenderer(), JSONParser()),
+    'json (orjson)': (ORJSONRenderer(), ORJSONParser()),
+    'msgpack': (MessagePackRenderer(), MessagePackParser()),
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность кодирования и декодирования больших ответов пакетной и матричной '
+            'конвертации для JSONRenderer, ORJSONRenderer и MessagePackRenderer.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=1000, help='Количество конвертаций или сумм в ответе.')
+        parser.add_argument('--repeat', type=int, default=20, help='Количество повторов, берется лучший результат.')
+
+    def handle(self, *args, **options):
+        payloads = {'batch': self.batch_payload(options['items']), 'matrix': self.matrix_payload(options['items'])}
+        for payload_name, payload in payloads.items():
+            self.stdout.write(f'{payload_name} ({options["items"]} элементов)')
+            for format_name, (renderer, parser) in FORMATS.items():
+                body = renderer.render(payload)
+                encode = self.measure(lambda: renderer.render(payload), options['repeat'])
+                decode = self.measure(lambda: parser.parse(io.BytesIO(body)), options['repeat'])
+                self.stdout.write(
+                    f'  {format_name:<14} {len(body) / 1024:9.1f} КБ  '
+                    f'кодирование {len(body) / encode / 2 ** 20:8.1f} МБ/с  '
+                    f'декодирование {len(body) / decode / 2 ** 20:8.1f} МБ/с'
+                )
+
+    @staticmethod
+    def measure(func, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    @staticmethod
+    def batch_payload(count):
+        """Метод возвращает ответ пакетной конвертации из <count> результатов."""
+
+        results = []
+        error = {'errors': {'converter_user': 'Пользователь не добавил текущую валюту для конвертации.'}}
+        for index in range(count):
+            if index % 10 == 9:
+                results.append(error)
+                continue
+            amount = Decimal(index) + Decimal('0.5')
+            results.append({'converter': f'{amount} CNY = {amount * Decimal("0.138462")} USD'})
+        return {'results': results}
+
+    @staticmethod
+    def matrix_payload(count):
+        """Метод возвращает ответ матричной конвертации <count> сумм во все актуальные валюты."""
+
+        rates = {code: Decimal('1.234567') for code in CURRENCIES if code != 'CNY'}
+        return {
+            'base_currency': 'CNY',
+            'targets': list(rates),
+            'matrix': [
+                {'amount': Decimal(index), 'converted': {target: str(rate * index) for target, rate in rates.items()}}
+                for index in range(1, count + 1)
+            ],
+        }
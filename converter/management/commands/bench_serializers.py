@@ -0,0 +1,79 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from converter.models import Converter, CurrencyRate, RateSnapshot
+from converter.payloads import RATE_FIELD, converter_payload
+from converter.serializers import ConverterDetailSerializer
+from users.models import User
+
+CODES = ('GBP', 'USD', 'EUR', 'CNY')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время сериализации одного объекта Converter через ConverterDetailSerializer и через '
+            'converter/payloads.py. Объекты создаются в памяти, база данных не используется.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--objects', type=int, default=10000, help='Количество объектов.')
+        parser.add_argument('--repeat', type=int, default=5, help='Количество повторов, берется лучший результат.')
+
+    def handle(self, *args, **options):
+        instances, rows = self.make_objects(options['objects'])
+        instance = instances[0]
+        rates = {instance.rates_snapshot_id: [
+            {'code': rate.code, 'currency_rate': RATE_FIELD.to_representation(rate.currency_rate)}
+            for rate in instance.rates
+        ]}
+
+        # Курсы снимка в быстром пути выбираются отдельно, поэтому в замер входит только сборка ответа
+        results = {
+            'ConverterDetailSerializer': self.measure(
+                lambda: ConverterDetailSerializer(instances, many=True).data, options['repeat']
+            ),
+            'converter_payload': self.measure(
+                lambda: [converter_payload(row, rates) for row in rows], options['repeat']
+            ),
+        }
+
+        baseline = results['ConverterDetailSerializer']
+        for name, seconds in results.items():
+            per_object = seconds / len(instances) * 10 ** 6
+            self.stdout.write(f'{name:<28} {per_object:10.2f} мкс/объект  x{baseline / seconds:.1f}')
+
+    @staticmethod
+    def measure(func, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    @staticmethod
+    def make_objects(count):
+        """Метод создает <count> объектов Converter с общим снимком курсов и такие же строки values()."""
+
+        now = timezone.now()
+        user = User(pk=1, email='bench@test.com')
+        snapshot = RateSnapshot(pk=1, base='USD', fetched_at=now)
+        snapshot_rates = [CurrencyRate(pk=index, snapshot=snapshot, code=code, currency_rate=Decimal('1.234567'))
+                          for index, code in enumerate(CODES[:-1], start=1)]
+
+        instances, rows = [], []
+        for pk in range(1, count + 1):
+            created = now - timedelta(seconds=pk)
+            instance = Converter(pk=pk, title=f'Конвертер {pk}', code=CODES[pk % len(CODES)],
+                                 converter_user=user, created=created, changed=now)
+
+            # Курсы снимка подставляются как загруженные prefetch_rates, чтобы сериализатор не обращался к базе данных
+            instance.rates_snapshot_id, instance._rates = snapshot.pk, snapshot_rates
+            instances.append(instance)
+            rows.append({'id': pk, 'title': instance.title, 'code': instance.code, 'rates_snapshot_id': snapshot.pk,
+                         'converter_user_id': user.pk, 'converter_user_email': user.email, 'created': created,
+                         'changed': now})
+        return instances, rows
@@ -0,0 +1,26 @@
+from django.core.management import BaseCommand
+
+from converter.stub_server import RateStubServer
+
+
+class Command(BaseCommand):
+    help = 'Запускает локальный сервер-заглушку apilayer для нагрузочного тестирования без сети.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument('--latency', type=float, default=0.2, help='Средняя задержка ответа в секундах.')
+        parser.add_argument('--jitter', type=float, default=0.05, help='Разброс задержки в секундах.')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 503 от 0 до 1.')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        server = RateStubServer((options['host'], options['port']), latency=options['latency'],
+                                jitter=options['jitter'], error_rate=options['error_rate'], seed=options['seed'])
+        self.stdout.write(f'Сервер-заглушка apilayer доступен по адресу {server.url}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,52 @@
+from decimal import Decimal, ROUND_HALF_EVEN, localcontext
+
+from django.conf import settings
+from django.utils import timezone
+
+RATE_QUANT = Decimal('0.000001')
+
+
+class RateMatrix:
+    """Матрица курсов валют, построенная по одному ответу apilayer относительно опорной валюты <pivot>. Кросс-курс
+    base/target вычисляется локально как rates[target] / rates[base], поэтому N базовых валют стоят одного запроса
+    вместо N. <fetched_at> — время получения ответа apilayer."""
+
+    def __init__(self, pivot, rates, fetched_at=None):
+        self.pivot = pivot.upper()
+        self.fetched_at = fetched_at or timezone.now()
+        self.rates = {code.upper(): Decimal(str(rate)) for code, rate in rates.items()}
+        self.rates[self.pivot] = Decimal(1)
+
+    def __contains__(self, code):
+        return code.upper() in self.rates
+
+    @property
+    def currencies(self):
+        return sorted(self.rates)
+
+    def rate(self, base, target):
+        """Метод возвращает кросс-курс <base>/<target>, округленный до точности поля CurrencyRate."""
+
+        with localcontext() as context:
+            context.prec = 28
+            value = self.rates[target.upper()] / self.rates[base.upper()]
+            return value.quantize(RATE_QUANT, rounding=ROUND_HALF_EVEN)
+
+    def rates_for(self, base, targets=None):
+        """Метод возвращает словарь курсов <targets> в отношение <base>. По умолчанию — все валюты, кроме <base>."""
+
+        base = base.upper()
+        if targets is None:
+            targets = [code for code in self.currencies if code != base]
+        return {target.upper(): self.rate(base, target) for target in targets}
+
+    def convert(self, amount, base, target):
+        return self.rate(base, target) * Decimal(amount)
+
+
+def matrix_symbols(currencies, pivot=None):
+    """Функция возвращает опорную валюту и отсортированный список остальных валют для запроса к apilayer."""
+
+    pivot = (pivot or settings.RATE_MATRIX_PIVOT).upper()
+    symbols = sorted({code.upper() for code in currencies} - {pivot})
+    return pivot, symbols
@@ -0,0 +1,37 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('converter', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('base', models.CharField(max_length=3, verbose_name='Базовая валюта')),
+                ('fetched_at', models.DateTimeField(verbose_name='Дата получения')),
+            ],
+            options={
+                'verbose_name': 'Снимок курсов валют',
+                'verbose_name_plural': 'Снимки курсов валют',
+                'constraints': [models.UniqueConstraint(fields=('base', 'fetched_at'), name='unique_rate_snapshot')],
+            },
+        ),
+        migrations.AddField(
+            model_name='currencyrate',
+            name='snapshot',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rates',
+                                    to='converter.ratesnapshot', verbose_name='Снимок'),
+        ),
+        migrations.AddField(
+            model_name='converter',
+            name='snapshot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL,
+                                    related_name='converters', to='converter.ratesnapshot', verbose_name='курсы'),
+        ),
+    ]
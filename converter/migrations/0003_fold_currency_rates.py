@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.db import migrations
+
+
+def fold_rates_into_snapshots(apps, schema_editor):
+    """Объединяет одинаковые наборы курсов разных объектов Converter в общие снимки RateSnapshot. Датой снимка
+    становится последняя дата изменения объектов Converter группы."""
+
+    Converter = apps.get_model('converter', 'Converter')
+    CurrencyRate = apps.get_model('converter', 'CurrencyRate')
+    RateSnapshot = apps.get_model('converter', 'RateSnapshot')
+
+    groups = {}
+    for converter in Converter.objects.prefetch_related('rate').order_by('pk'):
+        rates = list(converter.rate.all())
+        if not rates:
+            continue
+        key = (converter.code, frozenset((rate.code, rate.currency_rate) for rate in rates))
+        groups.setdefault(key, []).append((converter, rates))
+
+    for (base, _), members in groups.items():
+        fetched_at = max(converter.changed for converter, _ in members)
+        while RateSnapshot.objects.filter(base=base, fetched_at=fetched_at).exists():
+            fetched_at += timedelta(microseconds=1)
+        snapshot = RateSnapshot.objects.create(base=base, fetched_at=fetched_at)
+
+        # Курсы первого объекта группы переходят в снимок, остальные копии удаляются ниже
+        CurrencyRate.objects.filter(pk__in=[rate.pk for rate in members[0][1]]).update(snapshot=snapshot)
+        Converter.objects.filter(pk__in=[converter.pk for converter, _ in members]).update(snapshot=snapshot)
+
+    CurrencyRate.objects.filter(snapshot__isnull=True).delete()
+
+
+def unfold_snapshots(apps, schema_editor):
+    """Восстанавливает собственные копии курсов для каждого объекта Converter."""
+
+    Converter = apps.get_model('converter', 'Converter')
+    CurrencyRate = apps.get_model('converter', 'CurrencyRate')
+
+    for converter in Converter.objects.filter(snapshot__isnull=False):
+        for rate in CurrencyRate.objects.filter(snapshot_id=converter.snapshot_id, converter__isnull=True):
+            copy = CurrencyRate.objects.create(code=rate.code, currency_rate=rate.currency_rate)
+            converter.rate.add(copy)
+    CurrencyRate.objects.filter(converter__isnull=True).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('converter', '0002_ratesnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(fold_rates_into_snapshots, unfold_snapshots),
+    ]
@@ -0,0 +1,22 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('converter', '0003_fold_currency_rates'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='converter',
+            name='rate',
+        ),
+        migrations.AlterField(
+            model_name='currencyrate',
+            name='snapshot',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rates',
+                                    to='converter.ratesnapshot', verbose_name='Снимок'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+def delete_duplicate_converters(apps, schema_editor):
+    """Удаляет повторные объекты Converter одного пользователя с одной валютой. Остается объект с последней датой
+    изменения."""
+
+    Converter = apps.get_model('converter', 'Converter')
+
+    seen = set()
+    duplicates = []
+    for pk, user_id, code in Converter.objects.order_by('-changed', '-pk').values_list('pk', 'converter_user_id',
+                                                                                      'code'):
+        if (user_id, code) in seen:
+            duplicates.append(pk)
+        seen.add((user_id, code))
+    Converter.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('converter', '0004_remove_converter_rate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_converters, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='converter',
+            constraint=models.UniqueConstraint(fields=('converter_user', 'code'), name='unique_converter_user_code'),
+        ),
+        migrations.AddConstraint(
+            model_name='currencyrate',
+            constraint=models.UniqueConstraint(fields=('snapshot', 'code'), name='unique_currency_rate_snapshot_code'),
+        ),
+    ]
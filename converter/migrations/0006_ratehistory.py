@@ -0,0 +1,112 @@
+from datetime import date
+
+from django.db import DatabaseError, migrations, models, transaction
+from django.utils import timezone
+
+# Секции на ближайшие месяцы; следующие создает задача converter.tasks.create_rate_history_partitions
+PARTITIONS_AHEAD = 3
+
+TABLE_SQL = (
+    'CREATE TABLE {table} ('
+    'id bigint GENERATED BY DEFAULT AS IDENTITY, '
+    'base varchar(3) NOT NULL, '
+    'target varchar(3) NOT NULL, '
+    'rate numeric(50, 6) NOT NULL, '
+    'observed_at timestamp with time zone NOT NULL, '
+    'PRIMARY KEY (id, observed_at), '
+    'CONSTRAINT unique_rate_history UNIQUE (base, target, observed_at)'
+    ') PARTITION BY RANGE (observed_at)',
+    'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT',
+    'CREATE INDEX {table}_observed_at_brin ON {table} USING brin (observed_at)',
+)
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def create_partitions(schema_editor, table, start):
+    """Создает месячные секции таблицы истории курсов с месяца <start> до PARTITIONS_AHEAD месяцев вперед."""
+
+    month = add_months(start, 0)
+    last = add_months(timezone.now().date(), PARTITIONS_AHEAD)
+    with schema_editor.connection.cursor() as cursor:
+        while month <= last:
+            partition = f'{table}_p{month:%Y%m}'
+            cursor.execute('SELECT to_regclass(%s)', [partition])
+            if cursor.fetchone()[0] is None:
+                try:
+                    with transaction.atomic(using=schema_editor.connection.alias):
+                        cursor.execute(
+                            f"CREATE TABLE {partition} PARTITION OF {table} "
+                            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+                        )
+                except DatabaseError:
+                    # Строки за этот месяц уже попали в секцию по умолчанию
+                    pass
+            month = add_months(month, 1)
+
+
+def partition_rate_history(apps, schema_editor):
+    """В PostgreSQL пересоздает пустую таблицу истории курсов секционированной по месяцам <observed_at>, с
+    BRIN-индексом по <observed_at> и секциями на ближайшие месяцы."""
+
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    RateHistory = apps.get_model('converter', 'RateHistory')
+    table = RateHistory._meta.db_table
+    schema_editor.delete_model(RateHistory)
+    for sql in TABLE_SQL:
+        schema_editor.execute(sql.format(table=table))
+    create_partitions(schema_editor, table, timezone.now().date())
+
+
+def fill_rate_history(apps, schema_editor):
+    """Переносит в историю курсов все сохраненные снимки курсов."""
+
+    CurrencyRate = apps.get_model('converter', 'CurrencyRate')
+    RateHistory = apps.get_model('converter', 'RateHistory')
+    RateSnapshot = apps.get_model('converter', 'RateSnapshot')
+
+    first = RateSnapshot.objects.order_by('fetched_at').first()
+    if first is None:
+        return
+    if schema_editor.connection.vendor == 'postgresql':
+        create_partitions(schema_editor, RateHistory._meta.db_table, first.fetched_at.date())
+
+    rates = CurrencyRate.objects.values_list('snapshot__base', 'code', 'currency_rate', 'snapshot__fetched_at')
+    RateHistory.objects.bulk_create(
+        (RateHistory(base=base, target=target, rate=rate, observed_at=observed_at)
+         for base, target, rate, observed_at in rates.iterator()),
+        batch_size=1000,
+        ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('converter', '0005_converter_unique_user_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('base', models.CharField(max_length=3, verbose_name='Базовая валюта')),
+                ('target', models.CharField(max_length=3, verbose_name='Целевая валюта')),
+                ('rate', models.DecimalField(decimal_places=6, max_digits=50, verbose_name='Курс')),
+                ('observed_at', models.DateTimeField(verbose_name='Дата получения')),
+            ],
+            options={
+                'verbose_name': 'Курс валют в истории',
+                'verbose_name_plural': 'История курсов валют',
+                'constraints': [models.UniqueConstraint(fields=('base', 'target', 'observed_at'),
+                                                        name='unique_rate_history')],
+            },
+        ),
+        migrations.RunPython(partition_rate_history, migrations.RunPython.noop),
+        migrations.RunPython(fill_rate_history, migrations.RunPython.noop),
+    ]
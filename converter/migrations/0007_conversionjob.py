@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('converter', '0006_ratehistory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='conversion_jobs/', verbose_name='Файл')),
+                ('input_format', models.CharField(max_length=10, verbose_name='Формат')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Выполнена'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('rows_done', models.PositiveBigIntegerField(default=0, verbose_name='Обработано строк')),
+                ('rows_failed', models.PositiveBigIntegerField(default=0, verbose_name='Строк с ошибками')),
+                ('chunks', models.PositiveIntegerField(default=0, verbose_name='Количество пачек')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата добавления')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата начала')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата окончания')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversion_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Конвертация файла',
+                'verbose_name_plural': 'Конвертации файлов',
+            },
+        ),
+        migrations.CreateModel(
+            name='ConversionJobChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField(verbose_name='Номер')),
+                ('rows', models.JSONField(verbose_name='Результаты')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='result_chunks', to='converter.conversionjob', verbose_name='Конвертация')),
+            ],
+            options={
+                'verbose_name': 'Пачка результатов конвертации',
+                'verbose_name_plural': 'Пачки результатов конвертации',
+                'constraints': [models.UniqueConstraint(fields=('job', 'index'), name='unique_conversion_job_chunk')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('converter', '0007_conversionjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='converter',
+            index=models.Index(fields=['converter_user', 'created'], name='converter_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='converter',
+            index=models.Index(fields=['converter_user', 'changed'], name='converter_user_changed_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:14
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('converter', '0008_converter_user_created_changed_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='converter',
+            name='snapshot',
+        ),
+    ]
@@ -1,23 +1,161 @@
 from django.db import models
+from django.db.models import OuterRef, Subquery
+
+
+class ConverterQuerySet(models.QuerySet):
+    def with_rates_snapshot(self):
+        """Метод добавляет к объектам поле <rates_snapshot_id> — последний снимок курсов их базовой валюты."""
+
+        return self.annotate(rates_snapshot_id=latest_snapshot(OuterRef('code')))
 
 
 # Create your models here.
 class Converter(models.Model):
     title = models.CharField(max_length=150, verbose_name='Название')
     code = models.CharField(max_length=3, verbose_name='Код')
-    rate = models.ManyToManyField('converter.CurrencyRate', verbose_name='курс')
     created = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата добавления')
     changed = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата изменения')
     converter_user = models.ForeignKey('users.User', on_delete=models.CASCADE, verbose_name='Создатель')
 
+    objects = ConverterQuerySet.as_manager()
+
     def __str__(self):
         return f'Конвертер {self.title}.'
 
+    @property
+    def rates(self):
+        """Курсы валют последнего снимка базовой валюты. Снимки общие для всех пользователей, поэтому при
+        обновлении курсов добавляется один снимок, а объекты Converter не изменяются."""
+
+        if hasattr(self, '_rates'):
+            return self._rates
+        return CurrencyRate.objects.filter(snapshot_id=latest_snapshot(self.code))
+
     class Meta:
         verbose_name = 'Конвертер валют'
         verbose_name_plural = 'Конвертеры валют'
+        constraints = [
+            models.UniqueConstraint(fields=('converter_user', 'code'), name='unique_converter_user_code'),
+        ]
+        indexes = [
+            models.Index(fields=('converter_user', 'created'), name='converter_user_created_idx'),
+            models.Index(fields=('converter_user', 'changed'), name='converter_user_changed_idx'),
+        ]
+
+
+class RateSnapshot(models.Model):
+    """Общий для всех пользователей снимок курсов валют в отношение <base>, полученный в момент <fetched_at>."""
+
+    base = models.CharField(max_length=3, verbose_name='Базовая валюта')
+    fetched_at = models.DateTimeField(verbose_name='Дата получения')
+
+    def __str__(self):
+        return f'Курсы {self.base} на {self.fetched_at}.'
+
+    class Meta:
+        verbose_name = 'Снимок курсов валют'
+        verbose_name_plural = 'Снимки курсов валют'
+        constraints = [
+            models.UniqueConstraint(fields=('base', 'fetched_at'), name='unique_rate_snapshot'),
+        ]
 
 
 class CurrencyRate(models.Model):
+    snapshot = models.ForeignKey('converter.RateSnapshot', on_delete=models.CASCADE, related_name='rates',
+                                 verbose_name='Снимок')
     code = models.CharField(max_length=3, verbose_name='Код')
     currency_rate = models.DecimalField(max_digits=50, decimal_places=6)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=('snapshot', 'code'), name='unique_currency_rate_snapshot_code'),
+        ]
+
+
+def latest_snapshot(base, field='pk'):
+    """Функция возвращает подзапрос поля <field> последнего снимка курсов в отношение <base> (кода валюты или
+    OuterRef)."""
+
+    return Subquery(RateSnapshot.objects.filter(base=base).order_by('-fetched_at').values(field)[:1])
+
+
+def prefetch_rates(converters):
+    """Функция загружает одним запросом курсы последних снимков для объектов Converter <converters>, выбранных
+    через with_rates_snapshot(). Возвращает список объектов."""
+
+    converters = list(converters)
+    rates = {converter.rates_snapshot_id: [] for converter in converters if converter.rates_snapshot_id is not None}
+    for rate in CurrencyRate.objects.filter(snapshot_id__in=rates).order_by('pk'):
+        rates[rate.snapshot_id].append(rate)
+    for converter in converters:
+        converter._rates = rates.get(converter.rates_snapshot_id, [])
+    return converters
+
+
+class RateHistory(models.Model):
+    """История курсов валют: строки только добавляются. В PostgreSQL таблица секционирована по месяцам поля
+    <observed_at> и дополнительно имеет BRIN-индекс по нему (см. миграцию 0006_ratehistory и
+    converter/history.py)."""
+
+    base = models.CharField(max_length=3, verbose_name='Базовая валюта')
+    target = models.CharField(max_length=3, verbose_name='Целевая валюта')
+    rate = models.DecimalField(max_digits=50, decimal_places=6, verbose_name='Курс')
+    observed_at = models.DateTimeField(verbose_name='Дата получения')
+
+    def __str__(self):
+        return f'{self.base}/{self.target} на {self.observed_at}.'
+
+    class Meta:
+        verbose_name = 'Курс валют в истории'
+        verbose_name_plural = 'История курсов валют'
+        constraints = [
+            models.UniqueConstraint(fields=('base', 'target', 'observed_at'), name='unique_rate_history'),
+        ]
+
+
+class ConversionJob(models.Model):
+    """Фоновая конвертация загруженного файла. Результаты сохраняются пачками в ConversionJobChunk."""
+
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='conversion_jobs',
+                             verbose_name='Пользователь')
+    file = models.FileField(upload_to='conversion_jobs/', verbose_name='Файл')
+    input_format = models.CharField(max_length=10, verbose_name='Формат')
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING, verbose_name='Статус')
+    rows_done = models.PositiveBigIntegerField(default=0, verbose_name='Обработано строк')
+    rows_failed = models.PositiveBigIntegerField(default=0, verbose_name='Строк с ошибками')
+    chunks = models.PositiveIntegerField(default=0, verbose_name='Количество пачек')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created = models.DateTimeField(auto_now_add=True, verbose_name='Дата добавления')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата начала')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата окончания')
+
+    def __str__(self):
+        return f'Конвертация файла {self.pk}.'
+
+    class Meta:
+        verbose_name = 'Конвертация файла'
+        verbose_name_plural = 'Конвертации файлов'
+
+
+class ConversionJobChunk(models.Model):
+    """Пачка результатов фоновой конвертации. Номер пачки — номер страницы результатов."""
+
+    job = models.ForeignKey('converter.ConversionJob', on_delete=models.CASCADE, related_name='result_chunks',
+                            verbose_name='Конвертация')
+    index = models.PositiveIntegerField(verbose_name='Номер')
+    rows = models.JSONField(verbose_name='Результаты')
+
+    class Meta:
+        verbose_name = 'Пачка результатов конвертации'
+        verbose_name_plural = 'Пачки результатов конвертации'
+        constraints = [
+            models.UniqueConstraint(fields=('job', 'index'), name='unique_conversion_job_chunk'),
+        ]
@@ -0,0 +1,155 @@
+from decimal import Decimal, ROUND_CEILING, ROUND_DOWN, ROUND_FLOOR, ROUND_HALF_DOWN, ROUND_HALF_EVEN, \
+    ROUND_HALF_UP, ROUND_UP, localcontext
+
+import numpy as np
+
+# Курсы хранятся как целые числа с шестью знаками после запятой, как в поле CurrencyRate.currency_rate
+RATE_SCALE = 10 ** 6
+INT64_MAX = np.iinfo(np.int64).max
+
+
+class Currency:
+    """Валюта: количество знаков дробных единиц (центов, пенсов) и режим округления результата конвертации."""
+
+    def __init__(self, code, exponent=2, rounding=ROUND_HALF_EVEN):
+        self.code = code
+        self.exponent = exponent
+        self.rounding = rounding
+
+    def __repr__(self):
+        return f'Currency({self.code!r}, {self.exponent}, {self.rounding})'
+
+
+CURRENCIES = {
+    'GBP': Currency('GBP'),
+    'USD': Currency('USD'),
+    'EUR': Currency('EUR'),
+    'CNY': Currency('CNY', rounding=ROUND_HALF_UP),
+}
+
+
+def get_currency(code):
+    return CURRENCIES[code.upper()]
+
+
+class Money:
+    """Сумма в дробных единицах валюты, хранящаяся целым числом."""
+
+    __slots__ = ('minor', 'currency')
+
+    def __init__(self, minor, currency):
+        self.minor = int(minor)
+        self.currency = currency if isinstance(currency, Currency) else get_currency(currency)
+
+    @classmethod
+    def from_decimal(cls, amount, currency):
+        """Метод создает сумму из десятичного числа, округляя его по правилам валюты."""
+
+        currency = currency if isinstance(currency, Currency) else get_currency(currency)
+        minor = Decimal(amount).scaleb(currency.exponent).quantize(Decimal(1), rounding=currency.rounding)
+        return cls(minor, currency)
+
+    def to_decimal(self):
+        return Decimal(self.minor).scaleb(-self.currency.exponent)
+
+    def convert(self, target, rate):
+        """Метод конвертирует сумму в валюту <target> по курсу <rate>."""
+
+        target = target if isinstance(target, Currency) else get_currency(target)
+        return Money(convert_minor(self.minor, scale_rate(rate), self.currency, target), target)
+
+    def __eq__(self, other):
+        return isinstance(other, Money) and (self.minor, self.currency.code) == (other.minor, other.currency.code)
+
+    def __hash__(self):
+        return hash((self.minor, self.currency.code))
+
+    def __repr__(self):
+        return f'Money({self.minor}, {self.currency.code!r})'
+
+    def __str__(self):
+        return f'{self.to_decimal()} {self.currency.code}'
+
+
+def scale_rate(rate):
+    """Функция возвращает курс как целое число с RATE_SCALE. Курс с большей точностью не принимается."""
+
+    scaled = Decimal(rate) * RATE_SCALE
+    if scaled != scaled.to_integral_value():
+        raise ValueError(f'Курс {rate} содержит больше шести знаков после запятой.')
+    return int(scaled)
+
+
+def conversion_factors(rate_scaled, base, target):
+    """Функция возвращает числитель и знаменатель, на которые умножается и делится сумма в дробных единицах
+    <base>, чтобы получить сумму в дробных единицах <target>."""
+
+    numerator, denominator = rate_scaled, RATE_SCALE
+    shift = target.exponent - base.exponent
+    if shift >= 0:
+        numerator *= 10 ** shift
+    else:
+        denominator *= 10 ** -shift
+    return numerator, denominator
+
+
+def convert_minor(minor, rate_scaled, base, target):
+    """Эталонная конвертация одной суммы в дробных единицах через Decimal."""
+
+    numerator, denominator = conversion_factors(rate_scaled, base, target)
+    with localcontext() as context:
+        context.prec = 60
+        value = Decimal(minor) * numerator / denominator
+        return int(value.quantize(Decimal(1), rounding=target.rounding))
+
+
+def convert_minor_array(minors, rate_scaled, base, target):
+    """Векторная конвертация массива сумм в дробных единицах <base> в дробные единицы <target>.
+
+    Вычисления выполняются в int64 без перехода к числам с плавающей точкой, поэтому результат совпадает с
+    convert_minor для каждого элемента. Если произведение суммы на курс может не поместиться в int64, то
+    вычисления выполняются над целыми числами Python (медленнее, но точно)."""
+
+    numerator, denominator = conversion_factors(rate_scaled, base, target)
+    limit = INT64_MAX // max(abs(numerator), 1)
+
+    # Диапазон проверяется до приведения к int64: суммы больше 2 ** 63 при приведении переполняются
+    if isinstance(minors, np.ndarray) and minors.dtype.kind in 'iu':
+        fits = not minors.size or (int(minors.max()) <= limit and int(minors.min()) >= -limit)
+        minors = minors.astype(np.int64 if fits else object, copy=False)
+    else:
+        minors = [int(minor) for minor in minors]
+        fits = not minors or (max(minors) <= limit and min(minors) >= -limit)
+        minors = np.array(minors, dtype=np.int64 if fits else object)
+
+    product = minors * numerator
+    quotient = product // denominator
+    remainder = product - quotient * denominator
+    return quotient + _rounding_increment(product, quotient, remainder, denominator, target.rounding)
+
+
+def _rounding_increment(product, quotient, remainder, denominator, rounding):
+    """Поправка к частному, округленному вниз, для режима округления <rounding>."""
+
+    inexact = np.asarray(remainder != 0, dtype=bool)
+    negative = np.asarray(product < 0, dtype=bool)
+    twice = remainder * 2
+    above = np.asarray(twice > denominator, dtype=bool)
+    half = np.asarray(twice == denominator, dtype=bool)
+    if rounding == ROUND_FLOOR:
+        increment = np.zeros_like(inexact)
+    elif rounding == ROUND_CEILING:
+        increment = inexact
+    elif rounding == ROUND_DOWN:
+        increment = inexact & negative
+    elif rounding == ROUND_UP:
+        increment = inexact & ~negative
+    elif rounding == ROUND_HALF_UP:
+        increment = above | (half & ~negative)
+    elif rounding == ROUND_HALF_DOWN:
+        increment = above | (half & negative)
+    elif rounding == ROUND_HALF_EVEN:
+        increment = above | (half & np.asarray(quotient % 2 == 1, dtype=bool))
+    else:
+        raise ValueError(f'Режим округления {rounding} не поддерживается.')
+    return increment.astype(np.int64)
@@ -0,0 +1,11 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ConverterCursorPagination(CursorPagination):
+    """Постраничный вывод по курсору (keyset) по индексированным полям <created> и <changed>: стоимость любой
+    страницы не зависит от ее удаленности от начала списка."""
+
+    ordering = '-created'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,59 @@
+from django.db.models import F, OuterRef
+from rest_framework import serializers
+
+from converter.models import CurrencyRate, latest_snapshot
+from converter.serializers import CurrencyRateSerializer
+
+# Поля сериализаторов, которыми значения форматируются так же, как в ConverterDetailSerializer
+DATETIME_FIELD = serializers.DateTimeField()
+RATE_FIELD = CurrencyRateSerializer().fields['currency_rate']
+
+CONVERTER_COLUMNS = ('id', 'title', 'code', 'converter_user_id', 'created', 'changed')
+
+
+def converter_rows(queryset):
+    """Функция возвращает строки объектов Converter из <queryset> словарями вместе с почтой владельца, последним
+    снимком курсов базовой валюты <rates_snapshot_id> и временем его получения <rates_fetched_at>, которые
+    выбираются в том же запросе."""
+
+    return queryset.values(
+        *CONVERTER_COLUMNS,
+        converter_user_email=F('converter_user__email'),
+        rates_snapshot_id=latest_snapshot(OuterRef('code')),
+        rates_fetched_at=latest_snapshot(OuterRef('code'), 'fetched_at'),
+    )
+
+
+def snapshot_rates(snapshot_ids):
+    """Функция возвращает курсы снимков <snapshot_ids> одним запросом: {snapshot_id: [{'code', 'currency_rate'}]}."""
+
+    rates = {snapshot_id: [] for snapshot_id in snapshot_ids if snapshot_id is not None}
+    if not rates:
+        return rates
+    for snapshot_id, code, currency_rate in CurrencyRate.objects.filter(snapshot_id__in=rates).order_by(
+        'pk'
+    ).values_list('snapshot_id', 'code', 'currency_rate'):
+        rates[snapshot_id].append({'code': code, 'currency_rate': RATE_FIELD.to_representation(currency_rate)})
+    return rates
+
+
+def converter_payload(row, rates):
+    """Функция собирает из строки <row> и курсов снимков <rates> такой же ответ, как ConverterDetailSerializer."""
+
+    return {
+        'id': row['id'],
+        'title': row['title'],
+        'code': row['code'],
+        'rate': rates.get(row['rates_snapshot_id'], []),
+        'converter_user': row['converter_user_email'],
+        'created': DATETIME_FIELD.to_representation(row['created']),
+        'changed': DATETIME_FIELD.to_representation(row['changed']),
+    }
+
+
+def converter_payloads(rows):
+    """Функция собирает ответы для строк <rows>. Курсы всех строк выбираются одним запросом."""
+
+    rows = list(rows)
+    rates = snapshot_rates({row['rates_snapshot_id'] for row in rows})
+    return [converter_payload(row, rates) for row in rows]
@@ -14,12 +14,15 @@ class IsActiveAndIsOwner(BasePermission):
         return False
 
     def has_object_permission(self, request, view, obj):
+        # Пользователи сравниваются по первичному ключу: request.user может быть пользователем из токена
+        # (users.authentication.ClaimsTokenUser), который не равен объекту User
+        is_owner = request.user.pk == obj.converter_user_id
         if request.method in SAFE_METHODS:
-            return request.user == obj.converter_user
+            return is_owner
         elif request.method in ('PATCH', 'PUT', 'POST'):
-            return request.user == obj.converter_user
+            return is_owner
         elif request.method == 'DELETE':
             if not request.user.is_authenticated:
                 return False
-            return request.user == obj.converter_user or request.user.is_superuser
+            return is_owner or request.user.is_superuser
         return False
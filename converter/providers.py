@@ -0,0 +1,258 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import weakref
+import zlib
+from abc import ABC, abstractmethod
+from decimal import Decimal
+
+import httpx
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Курсы относительно EUR, которые отдают фейковый провайдер и локальный сервер-заглушка
+FAKE_EUR_RATES = {
+    'EUR': Decimal('1'),
+    'USD': Decimal('1.08'),
+    'GBP': Decimal('0.86'),
+    'CNY': Decimal('7.8'),
+}
+
+
+class BaseRateProvider(ABC):
+    """Интерфейс провайдера курсов валют. Наследники обязаны реализовать get_rates и aget_rates, иначе провайдер
+    нельзя создать. Базовый класс хранит настройки повторов и счетчики задержек."""
+
+    def __init__(self, retries=None, backoff=None):
+        self.retries = settings.RATE_PROVIDER_RETRIES if retries is None else retries
+        self.backoff = settings.RATE_PROVIDER_BACKOFF if backoff is None else backoff
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'errors': 0, 'retries': 0, 'total_time': 0.0, 'max_time': 0.0}
+
+    @abstractmethod
+    def get_rates(self, base, symbols):
+        """Метод возвращает курсы <symbols> в отношение <base> или None, если провайдер недоступен."""
+
+    @abstractmethod
+    async def aget_rates(self, base, symbols):
+        """Асинхронный вариант get_rates."""
+
+    async def aget_many_rates(self, queries):
+        """Метод одновременно запрашивает курсы для нескольких пар (<base>, <symbols>) и возвращает список ответов
+        в том же порядке."""
+
+        return await asyncio.gather(*(self.aget_rates(base, symbols) for base, symbols in queries))
+
+    def stats(self):
+        """Метод возвращает счетчики запросов и задержек текущего процесса."""
+
+        with self._lock:
+            stats = dict(self._stats)
+        stats['avg_time'] = stats['total_time'] / stats['requests'] if stats['requests'] else 0.0
+        return stats
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+    def _backoff_delay(self, attempt):
+        return random.uniform(0, self.backoff * 2 ** (attempt - 1))
+
+    def _incr(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _observe(self, started, failed):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['total_time'] += elapsed
+            self._stats['max_time'] = max(self._stats['max_time'], elapsed)
+            if failed:
+                self._stats['errors'] += 1
+
+
+class ApilayerRateProvider(BaseRateProvider):
+    """Клиент apilayer. Хранит keep-alive сессию с пулом соединений на процесс (и httpx-клиент на цикл событий для
+    асинхронных запросов, закрываемый вместе с циклом), ограничивает время подключения и чтения и повторяет
+    неудачные запросы с экспоненциальной задержкой со случайным разбросом."""
+
+    def __init__(self, url=None, api_key=None, connect_timeout=None, read_timeout=None, retries=None,
+                 backoff=None, pool_size=None, transport=None):
+        super().__init__(retries=retries, backoff=backoff)
+        self.url = url or settings.RATE_PROVIDER_URL
+        self.api_key = api_key or settings.API_KEY
+        self.timeout = (connect_timeout or settings.RATE_PROVIDER_CONNECT_TIMEOUT,
+                        read_timeout or settings.RATE_PROVIDER_READ_TIMEOUT)
+        self.pool_size = pool_size or settings.RATE_PROVIDER_POOL_SIZE
+        self.transport = transport
+        self._session = None
+        self._pid = None
+        self._clients = weakref.WeakKeyDictionary()
+
+    @property
+    def session(self):
+        """Сессия создается заново после fork, чтобы процессы не делили сокеты пула."""
+
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers['apikey'] = self.api_key or ''
+                self._session, self._pid = session, os.getpid()
+            return self._session
+
+    async def aget_client(self):
+        """Метод возвращает httpx-клиент текущего цикла событий. Клиент переиспользуется в пределах цикла и
+        закрывается при его остановке (см. _client_lifetime)."""
+
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(loop)
+        if entry is None:
+            client = httpx.AsyncClient(
+                headers={'apikey': self.api_key or ''},
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                limits=httpx.Limits(max_connections=self.pool_size * 10, max_keepalive_connections=self.pool_size),
+                transport=self.transport,
+            )
+            lifetime = self._client_lifetime(loop, client)
+            await lifetime.__anext__()
+            self._clients[loop] = entry = (client, lifetime)
+        return entry[0]
+
+    async def _client_lifetime(self, loop, client):
+        """Асинхронный генератор, который держит клиент открытым до остановки цикла событий. asyncio.run (и
+        async_to_sync, который под WSGI запускает каждое асинхронное представление в новом цикле) закрывает
+        незавершенные генераторы перед остановкой цикла, поэтому клиент и его пул соединений закрываются в том же
+        цикле, в котором были созданы."""
+
+        try:
+            yield
+        finally:
+            self._clients.pop(loop, None)
+            await client.aclose()
+
+    @staticmethod
+    def _parse_rates(content):
+        """Метод возвращает курсы из тела ответа или None, если тело не является JSON-объектом (например, HTML-страница
+        прокси с кодом 200). Такой ответ считается неудачной попыткой, а не ошибкой сервера."""
+
+        try:
+            data = json.loads(content, parse_float=Decimal)
+        except ValueError:
+            return None
+        return data.get('rates') if isinstance(data, dict) else None
+
+    def get_rates(self, base, symbols):
+        params = {'symbols': ','.join(symbols), 'base': base}
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._incr('retries')
+                time.sleep(self._backoff_delay(attempt))
+            started = time.perf_counter()
+            try:
+                response = self.session.get(self.url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                self._observe(started, failed=True)
+                continue
+            rates = self._parse_rates(response.content) if response.ok else None
+            self._observe(started, failed=rates is None)
+            if response.ok:
+                return rates
+            if response.status_code not in RETRY_STATUSES:
+                return None
+        return None
+
+    async def aget_rates(self, base, symbols):
+        params = {'symbols': ','.join(symbols), 'base': base}
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._incr('retries')
+                await asyncio.sleep(self._backoff_delay(attempt))
+            started = time.perf_counter()
+            try:
+                client = await self.aget_client()
+                response = await client.get(self.url, params=params)
+            except httpx.TransportError:
+                self._observe(started, failed=True)
+                continue
+            rates = self._parse_rates(response.content) if response.is_success else None
+            self._observe(started, failed=rates is None)
+            if response.is_success:
+                return rates
+            if response.status_code not in RETRY_STATUSES:
+                return None
+        return None
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    async def aclose(self):
+        entry = self._clients.get(asyncio.get_running_loop())
+        if entry is not None:
+            await entry[1].aclose()
+
+
+class FakeRateProvider(BaseRateProvider):
+    """Детерминированный провайдер без сети для тестов и нагрузочных прогонов. Курсы вычисляются по таблице
+    FAKE_EUR_RATES, для остальных валют — по контрольной сумме кода. Задержка <latency> имитирует время ответа
+    apilayer."""
+
+    def __init__(self, latency=None, retries=None, backoff=None):
+        super().__init__(retries=retries, backoff=backoff)
+        self.latency = settings.RATE_PROVIDER_FAKE_LATENCY if latency is None else latency
+
+    @staticmethod
+    def eur_rate(code):
+        code = code.upper()
+        if code in FAKE_EUR_RATES:
+            return FAKE_EUR_RATES[code]
+        return Decimal(100 + zlib.crc32(code.encode()) % 10000) / 100
+
+    def build_rates(self, base, symbols):
+        base_rate = self.eur_rate(base)
+        return {code.upper(): (self.eur_rate(code) / base_rate).quantize(Decimal('0.000001')) for code in symbols}
+
+    def get_rates(self, base, symbols):
+        started = time.perf_counter()
+        if self.latency:
+            time.sleep(self.latency)
+        rates = self.build_rates(base, symbols)
+        self._observe(started, failed=False)
+        return rates
+
+    async def aget_rates(self, base, symbols):
+        started = time.perf_counter()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        rates = self.build_rates(base, symbols)
+        self._observe(started, failed=False)
+        return rates
+
+
+_providers = {}
+_provider_lock = threading.Lock()
+
+
+def get_rate_provider():
+    """Функция возвращает общий для процесса провайдер курсов валют, выбранный настройкой RATE_PROVIDER_BACKEND."""
+
+    backend = settings.RATE_PROVIDER_BACKEND
+    with _provider_lock:
+        if backend not in _providers:
+            _providers[backend] = import_string(backend)()
+        return _providers[backend]
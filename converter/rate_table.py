@@ -0,0 +1,217 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+
+from converter.cache import get_redis_client
+from converter.models import Converter, CurrencyRate
+
+logger = logging.getLogger(__name__)
+
+
+def load_user_rates(user_id):
+    """Функция возвращает словарь {(base, target): currency_rate} по последним снимкам курсов базовых валют всех
+    объектов Converter пользователя. Все курсы выбираются одним запросом."""
+
+    converters = Converter.objects.filter(converter_user_id=user_id).with_rates_snapshot()
+    snapshots = converters.values('rates_snapshot_id')
+    rates = CurrencyRate.objects.filter(snapshot_id__in=snapshots).values_list(
+        'snapshot__base', 'code', 'currency_rate'
+    )
+    return {(base, target): rate for base, target, rate in rates}
+
+
+class RateTable:
+    """Скомпилированная таблица курсов пользователя {(base, target): currency_rate}.
+
+    Первый уровень — LRU внутри процесса, второй — общий кэш (Redis). Записи помечены общей версией и версией
+    пользователя. При сохранении нового снимка курсов увеличивается общая версия, и первый уровень очищается
+    целиком, а при сохранении объекта Converter — только версия его владельца, и устаревает лишь его таблица. Новые
+    версии рассылаются остальным процессам через Redis pub/sub, записи второго уровня с прежними версиями перестают
+    читаться. Повторная конвертация с прогретой таблицей не обращается к базе данных."""
+
+    def __init__(self, alias=None, maxsize=None, timeout=None, local_timeout=None, channel=None, prefix='rate_table',
+                 loader=load_user_rates):
+        self.alias = alias or settings.RATE_CACHE_ALIAS
+        self.maxsize = maxsize or settings.RATE_TABLE_L1_SIZE
+        self.timeout = settings.RATE_TABLE_TIMEOUT if timeout is None else timeout
+        self.local_timeout = settings.RATE_TABLE_L1_TIMEOUT if local_timeout is None else local_timeout
+        self.channel = channel or settings.RATE_TABLE_CHANNEL
+        self.prefix = prefix
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._local = OrderedDict()
+        self._user_versions = OrderedDict()
+        self._version = None
+        self._listener_pid = None
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def version_key(self):
+        return f'{self.prefix}:version'
+
+    def user_version_key(self, user_id):
+        return f'{self.prefix}:version:{user_id}'
+
+    def make_key(self, version, user_id, user_version=0):
+        return f'{self.prefix}:{version}:{user_id}:{user_version}'
+
+    def get(self, user_id, base, target):
+        """Метод возвращает курс <base>/<target> пользователя или None, если пользователь не добавил валюту."""
+
+        return self.get_table(user_id).get((base.upper(), target.upper()))
+
+    def get_table(self, user_id):
+        """Метод возвращает таблицу курсов пользователя: из LRU процесса, из общего кэша или из базы данных."""
+
+        self._ensure_listener()
+        version = self.version
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+                self._local.move_to_end(user_id)
+                return entry[2]
+
+        # При промахе LRU версии перечитываются из общего кэша: без Redis pub/sub новые версии узнаются только так
+        user_version_key = self.user_version_key(user_id)
+        versions = self.cache.get_many([self.version_key, user_version_key])
+        self._apply_version(versions.get(self.version_key, 0))
+        version, user_version = self.version, versions.get(user_version_key, 0)
+
+        key = self.make_key(version, user_id, user_version)
+        table = self.cache.get(key)
+        if table is None:
+            table = self.loader(user_id)
+            self.cache.set(key, table, self.shared_timeout)
+        self._remember(version, user_id, user_version, table)
+        return table
+
+    async def aget_table(self, user_id):
+        """Асинхронный вариант get_table: при промахе LRU обращение к кэшу и базе данных выполняется в потоке."""
+
+        version = self._version
+        entry = self._local.get(user_id)
+        if version is not None and entry is not None and entry[0] == version and entry[1] > time.monotonic():
+            return entry[2]
+        return await sync_to_async(self.get_table)(user_id)
+
+    async def aget(self, user_id, base, target):
+        return (await self.aget_table(user_id)).get((base.upper(), target.upper()))
+
+    @property
+    def shared_timeout(self):
+        """Время жизни записей второго уровня. Без Redis кэш может быть своим у каждого процесса, и версии других
+        процессов в него не попадают, поэтому записи живут не дольше записей первого уровня."""
+
+        if self._redis_client() is None:
+            return min(self.timeout, self.local_timeout)
+        return self.timeout
+
+    @property
+    def version(self):
+        if self._version is None:
+            self.cache.add(self.version_key, 0, None)
+            self._version = self.cache.get(self.version_key, 0)
+        return self._version
+
+    def invalidate(self, user_id=None):
+        """Метод увеличивает версию таблицы курсов пользователя <user_id> или, если пользователь не указан, общую
+        версию всех таблиц, и рассылает ее остальным процессам."""
+
+        key = self.version_key if user_id is None else self.user_version_key(user_id)
+        self.cache.add(key, 0, None)
+        version = self.cache.incr(key)
+        if user_id is None:
+            self._apply_version(version)
+            self._publish(version)
+        else:
+            self._apply_user_version(user_id, version)
+            self._publish(f'{user_id}:{version}')
+        return version
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+            self._user_versions.clear()
+            self._version = None
+
+    def _remember(self, version, user_id, user_version, table):
+        with self._lock:
+            # Таблица, загруженная до рассылки новой версии пользователя, в первый уровень не попадает
+            if user_version < self._user_versions.get(user_id, 0):
+                return
+            self._local[user_id] = (version, time.monotonic() + self.local_timeout, table)
+            self._local.move_to_end(user_id)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    def _apply_version(self, version):
+        with self._lock:
+            if self._version is None or int(version) > self._version:
+                self._version = int(version)
+                self._local.clear()
+
+    def _apply_user_version(self, user_id, user_version):
+        with self._lock:
+            if int(user_version) <= self._user_versions.get(user_id, 0):
+                return
+            self._user_versions[user_id] = int(user_version)
+            self._user_versions.move_to_end(user_id)
+            self._local.pop(user_id, None)
+            while len(self._user_versions) > self.maxsize:
+                self._user_versions.popitem(last=False)
+
+    def _apply_message(self, data):
+        """Метод применяет версию, полученную от другого процесса: <version> или <user_id>:<version>."""
+
+        user_id, _, version = (data.decode() if isinstance(data, bytes) else str(data)).rpartition(':')
+        if user_id:
+            self._apply_user_version(get_user_model()._meta.pk.to_python(user_id), version)
+        else:
+            self._apply_version(version)
+
+    def _publish(self, message):
+        client = self._redis_client()
+        if client is not None:
+            try:
+                client.publish(self.channel, message)
+            except Exception:
+                logger.warning('Не удалось разослать версию таблиц курсов.', exc_info=True)
+
+    def _redis_client(self):
+        return get_redis_client(self.alias)
+
+    def _ensure_listener(self):
+        """Метод запускает в текущем процессе поток, получающий новые версии таблиц курсов через Redis pub/sub."""
+
+        if self._listener_pid == os.getpid():
+            return
+        self._listener_pid = os.getpid()
+        client = self._redis_client()
+        if client is not None:
+            threading.Thread(target=self._listen, args=(client,), name='rate-table-listener', daemon=True).start()
+
+    def _listen(self, client):
+        while True:
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    self._apply_message(message['data'])
+            except Exception:
+                logger.warning('Подписка на версии таблиц курсов прервана.', exc_info=True)
+                # Пока подписки нет, сообщения о новых версиях могли быть потеряны
+                self.clear()
+                time.sleep(1)
+
+
+rate_table = RateTable()
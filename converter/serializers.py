@@ -1,10 +1,16 @@
 from datetime import datetime
 
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from rest_framework import serializers
 
-from converter.models import Converter, CurrencyRate
-from converter.services import get_currency_rate
-from converter.validators import CodeValidator, CodeUserValidator
+from converter.bulk import RENDERERS
+from converter.history import INTERVAL_SECONDS
+from converter.models import ConversionJob, Converter, CurrencyRate
+from converter.money import INT64_MAX
+from converter.services import StaleRates, get_currency_rate, save_rate_snapshot
+from converter.validators import CodeValidator
 from users.models import User
 
 
@@ -14,29 +20,55 @@ class CurrencyRateSerializer(serializers.ModelSerializer):
         fields = ('code', 'currency_rate',)
 
 
-class ConverterSerializer(serializers.ModelSerializer):
+class RatesAgeMixin(serializers.Serializer):
+    """Добавляет поле <rates_age> — возраст курсов в секундах, если вместо актуальных курсов были сохранены
+    последние известные курсы (провайдер курсов недоступен)."""
+
+    rates_age = serializers.SerializerMethodField()
+
+    def get_rates_age(self, obj):
+        return getattr(obj, 'rates_age', None)
+
+    @staticmethod
+    def mark_rates_age(instance, rates_data):
+        if isinstance(rates_data, StaleRates):
+            instance.rates_age = int(rates_data.age)
+
+
+class ConverterSerializer(RatesAgeMixin, serializers.ModelSerializer):
     """Для создания объектов модели Converter."""
 
     converter_user = serializers.SlugRelatedField(slug_field='email', queryset=User.objects.all())
 
     class Meta:
         model = Converter
-        fields = ('id', 'title', 'code', 'converter_user')
-        validators = [CodeValidator(code='code'),
-                      CodeUserValidator(code='code', user='converter_user')]
+        fields = ('id', 'title', 'code', 'converter_user', 'rates_age')
+        validators = [CodeValidator(code='code')]
+
+    def validate(self, attrs):
+        """Метод проверяет, что пользователь еще не добавлял валюту для конвертации. Проверка выполняется до запроса
+        курсов валют, поэтому повторный объект не обращается к провайдеру курсов."""
+
+        if Converter.objects.filter(code=attrs['code'].upper(), converter_user=attrs['converter_user']).exists():
+            raise serializers.ValidationError({'unique_code': ['Вы уже добавляли валюту для конвертации.']})
+        return attrs
 
     def create(self, validated_data):
-        """Метод создает объекты модели Converter и в поле <rate> записывает текущие курсы актуальных валют."""
+        """Метод создает объекты модели Converter и в поле <snapshot> записывает общий снимок текущих курсов
+        актуальных валют. Курсы запрашиваются до записи в базу данных, а сохранение снимка и объекта Converter
+        выполняется в одной транзакции."""
 
         # Получение переменных
         errors = {}
-        code = validated_data.get('code')
+        code = validated_data.get('code').upper()
         title = validated_data.get('title')
         converter_user = validated_data.get('converter_user')
-        converter = Converter.objects.create(title=title, code=code.upper(), converter_user=converter_user)
 
-        # Получение текущих курсов актуальных валют
-        rates_data = get_currency_rate(code)
+        # Получение текущих курсов актуальных валют, если они не были получены асинхронно до сохранения
+        if 'rates_data' in validated_data:
+            rates_data = validated_data.pop('rates_data')
+        else:
+            rates_data = get_currency_rate(code)
 
         # Если функция на получение текущих курсов валют возвращает None, то возбуждается исключение
         if not rates_data:
@@ -44,19 +76,24 @@ class ConverterSerializer(serializers.ModelSerializer):
         if errors:
             raise serializers.ValidationError(errors)
 
-        # Для созданной валюты создаются объекты модели CurrencyRate, связанные с текущим объектов через
-        # <многие-ко-многим>.
-        for data in rates_data:
-            rate_object = CurrencyRate.objects.create(code=data, currency_rate=rates_data.get(data))
-            converter.rate.add(rate_object)
-
+        # Полученные курсы сохраняются в общий для всех пользователей снимок базовой валюты. Если такой же объект был
+        # создан параллельным запросом после проверки в validate, то ограничение уникальности не даст создать второй
+        # объект, и транзакция вместе со снимком откатится
+        try:
+            with transaction.atomic():
+                save_rate_snapshot(code, rates_data)
+                converter = Converter.objects.create(title=title, code=code, converter_user=converter_user)
+        except IntegrityError:
+            raise serializers.ValidationError({'unique_code': ['Вы уже добавляли валюту для конвертации.']})
+
+        self.mark_rates_age(converter, rates_data)
         return converter
 
 
 class ConverterDetailSerializer(serializers.ModelSerializer):
     """Для получения детальной информации о текущем объекте модели Converter."""
 
-    rate = CurrencyRateSerializer(many=True)
+    rate = CurrencyRateSerializer(source='rates', many=True, read_only=True)
     converter_user = serializers.SlugRelatedField(slug_field='email', queryset=User.objects.all())
 
     class Meta:
@@ -64,24 +101,44 @@ class ConverterDetailSerializer(serializers.ModelSerializer):
         fields = ('id', 'title', 'code', 'rate', 'converter_user', 'created', 'changed')
 
 
-class ConverterUpdateSerializer(serializers.ModelSerializer):
+class ConverterListSerializer(serializers.ModelSerializer):
+    """Для списка объектов модели Converter текущего пользователя. Параметр <fields> ограничивает набор полей."""
+
+    rate = CurrencyRateSerializer(source='rates', many=True, read_only=True)
+    converter_user = serializers.SlugRelatedField(slug_field='email', read_only=True)
+
+    class Meta:
+        model = Converter
+        fields = ('id', 'title', 'code', 'rate', 'converter_user', 'created', 'changed')
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class ConverterUpdateSerializer(RatesAgeMixin, serializers.ModelSerializer):
     """Для обновления объектов модели Converter."""
 
     class Meta:
         model = Converter
-        fields = ('code', )
+        fields = ('code', 'rates_age')
         validators = [CodeValidator(code='code')]
 
     def update(self, instance, validated_data):
-        """Метод обновляет объекты модели Converter и в поле <rate> записывает текущие курсы актуальных валют. Также
-        осуществляется изменение поля <changed> на текущие время и дата."""
+        """Метод обновляет объекты модели Converter и в поле <snapshot> записывает общий снимок текущих курсов
+        актуальных валют. Также осуществляется изменение поля <changed> на текущие время и дата."""
 
         # Получение переменных
         errors = {}
         instance.code = instance.code
 
-        # Получение текущих курсов актуальных валют
-        rates_data = get_currency_rate(instance.code)
+        # Получение текущих курсов актуальных валют, если они не были получены асинхронно до сохранения
+        if 'rates_data' in validated_data:
+            rates_data = validated_data.pop('rates_data')
+        else:
+            rates_data = get_currency_rate(instance.code)
 
         # Если функция на получение текущих курсов валют возвращает None, то возбуждается исключение
         if not rates_data:
@@ -89,28 +146,100 @@ class ConverterUpdateSerializer(serializers.ModelSerializer):
         if errors:
             raise serializers.ValidationError(errors)
 
-        currency_rate = []
-
-        # Обновление объектов модели CurrencyRate, связанных с текущим объектов через <многие-ко-многим>.
-        for data in instance.rate.all():
-            data.currency_rate = rates_data.get(data.code)
-            data.save(update_fields=['currency_rate'])
-            currency_rate.append(data)
-        instance.rate.set(currency_rate)
-
-        # Изменение поля <changed> текущего объекта
+        # Сохранение нового снимка курсов базовой валюты и изменение поля <changed> текущего объекта
+        save_rate_snapshot(instance.code, rates_data)
         instance.changed = datetime.now()
         instance.save(update_fields=['changed'])
 
+        self.mark_rates_age(instance, rates_data)
         return instance
 
 
 class ConverterGetCurrencyRate(serializers.Serializer):
-    """Для конвертации валют по данным из базы данных."""
+    """Для конвертации валют по данным из базы данных. Если передано поле <as_of>, то используется курс,
+    действовавший в этот момент."""
 
     base_currency = serializers.CharField(max_length=3)
     target_currency = serializers.CharField(max_length=3)
-    amount = serializers.IntegerField()
+    amount = serializers.IntegerField(min_value=-INT64_MAX, max_value=INT64_MAX)
+    as_of = serializers.DateTimeField(required=False)
 
     class Meta:
         validators = [CodeValidator(code='base_currency'), CodeValidator(code='target_currency')]
+
+
+class ConverterGetCurrencyRateBatch(serializers.Serializer):
+    """Для пакетной конвертации валют по данным из базы данных. Каждый элемент <conversions> валидируется отдельно
+    сериализатором ConverterGetCurrencyRate."""
+
+    conversions = serializers.ListField(child=serializers.DictField(), allow_empty=False,
+                                        max_length=settings.RATE_BATCH_MAX_SIZE)
+
+
+class ConverterGetCurrencyRateMatrix(serializers.Serializer):
+    """Для конвертации одной или нескольких сумм из базовой валюты во все актуальные валюты."""
+
+    base_currency = serializers.CharField(max_length=3)
+    amounts = serializers.ListField(child=serializers.IntegerField(min_value=-INT64_MAX, max_value=INT64_MAX),
+                                    allow_empty=False, max_length=settings.RATE_BATCH_MAX_SIZE)
+
+    class Meta:
+        validators = [CodeValidator(code='base_currency')]
+
+
+class RateHistorySerializer(serializers.Serializer):
+    """Для получения истории курса валют за период с прореживанием по интервалам <interval>."""
+
+    base = serializers.CharField(max_length=3)
+    target = serializers.CharField(max_length=3)
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    interval = serializers.ChoiceField(choices=list(INTERVAL_SECONDS), default='hour')
+
+    class Meta:
+        validators = [CodeValidator(code='base'), CodeValidator(code='target')]
+
+    def validate(self, attrs):
+        errors = {}
+        attrs = super().validate(attrs)
+        seconds = (attrs['end'] - attrs['start']).total_seconds()
+        if seconds <= 0:
+            errors['end'] = 'Дата окончания периода должна быть больше даты начала.'
+        elif seconds / INTERVAL_SECONDS[attrs['interval']] > settings.RATE_HISTORY_MAX_POINTS:
+            errors['interval'] = 'Слишком много точек для выбранного периода, увеличьте интервал.'
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
+
+class ConverterBulkConvertSerializer(serializers.Serializer):
+    """Для конвертации файла в формате csv или ndjson. Если формат не указан, то он определяется по расширению
+    файла."""
+
+    file = serializers.FileField()
+    input_format = serializers.ChoiceField(choices=list(RENDERERS), required=False)
+
+    def validate(self, attrs):
+        if 'input_format' not in attrs:
+            extension = attrs['file'].name.rsplit('.', 1)[-1].lower()
+            attrs['input_format'] = 'ndjson' if extension in ('ndjson', 'jsonl') else 'csv'
+        return attrs
+
+
+class ConversionJobSerializer(serializers.ModelSerializer):
+    """Для получения состояния фоновой конвертации файла. <throughput> — скорость обработки в строках в секунду."""
+
+    pages = serializers.IntegerField(source='chunks', read_only=True)
+    throughput = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ConversionJob
+        fields = ('id', 'status', 'input_format', 'rows_done', 'rows_failed', 'pages', 'throughput', 'error',
+                  'created', 'started_at', 'finished_at')
+        read_only_fields = fields
+
+    def get_throughput(self, obj):
+        if obj.started_at is None:
+            return None
+        seconds = ((obj.finished_at or timezone.now()) - obj.started_at).total_seconds()
+        return round(obj.rows_done / seconds, 1) if seconds > 0 else None
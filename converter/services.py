@@ -1,23 +1,165 @@
-import requests
-from config.settings import API_KEY
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from converter.breaker import CircuitBreaker, CircuitOpenError
+from converter.cache import rate_cache
+from converter.history import record_rate_history
+from converter.matrix import RateMatrix, matrix_symbols
+from converter.models import CurrencyRate, RateSnapshot
+from converter.providers import get_rate_provider
+from converter.rate_table import rate_table
+
+rate_breaker = CircuitBreaker()
+
+
+class Rates(dict):
+    """Курсы валют в отношение базовой валюты. <fetched_at> — время, когда курсы были получены у провайдера."""
+
+    stale = False
+
+    def __init__(self, rates, fetched_at):
+        super().__init__(rates)
+        self.fetched_at = fetched_at
+
+    @property
+    def age(self):
+        """Возраст курсов в секундах."""
+
+        return (timezone.now() - self.fetched_at).total_seconds()
+
+
+class StaleRates(Rates):
+    """Последние сохраненные курсы валют, которые отдаются, пока провайдер курсов недоступен."""
+
+    stale = True
+
+
+def fetch_currency_rate(currency, symbols):
+    """Функция запрашивает у провайдера курсов курсы <symbols> в отношение <currency> в обход кэша. Если
+    предохранитель разомкнут, возбуждается CircuitOpenError."""
+
+    return rate_breaker.call(lambda: get_rate_provider().get_rates(currency, symbols))
+
+
+async def afetch_currency_rate(currency, symbols):
+    """Асинхронный вариант fetch_currency_rate."""
+
+    return await rate_breaker.acall(lambda: get_rate_provider().aget_rates(currency, symbols))
+
+
+def matrix_from_entry(pivot, entry):
+    if not entry or not entry['rates']:
+        return None
+    return RateMatrix(pivot, entry['rates'], datetime.fromtimestamp(entry['fetched_at'], tz=dt_timezone.utc))
+
+
+def get_rate_matrix(currencies=None):
+    """Функция возвращает матрицу курсов <currencies>, построенную по одному запросу к apilayer относительно опорной
+    валюты. Ответ apilayer кэшируется. Если apilayer недоступен, возвращается None."""
+
+    pivot, symbols = matrix_symbols(currencies or settings.RATE_CURRENCIES)
+    try:
+        entry = rate_cache.get_or_fetch_entry(pivot, symbols, lambda: fetch_currency_rate(pivot, symbols))
+    except CircuitOpenError:
+        return None
+    return matrix_from_entry(pivot, entry)
+
+
+async def aget_rate_matrix(currencies=None):
+    """Асинхронный вариант get_rate_matrix: запрос к apilayer не занимает поток воркера."""
+
+    pivot, symbols = matrix_symbols(currencies or settings.RATE_CURRENCIES)
+    try:
+        entry = await rate_cache.aget_or_fetch_entry(pivot, symbols, lambda: afetch_currency_rate(pivot, symbols))
+    except CircuitOpenError:
+        return None
+    return matrix_from_entry(pivot, entry)
+
+
+def refresh_rate_matrix(currencies=None):
+    """Функция запрашивает матрицу курсов у apilayer в обход кэша и сохраняет ответ в кэш. Используется для
+    фонового прогрева кэша."""
+
+    pivot, symbols = matrix_symbols(currencies or settings.RATE_CURRENCIES)
+    try:
+        rates = fetch_currency_rate(pivot, symbols)
+    except CircuitOpenError:
+        return None
+    return matrix_from_entry(pivot, rate_cache.set(rate_cache.make_key(pivot, symbols), rates))
+
+
+def last_known_snapshot_queryset(currency):
+    return RateSnapshot.objects.filter(base=currency.upper()).order_by('-fetched_at')
+
+
+def get_last_known_rates(currency, targets):
+    """Функция возвращает последние сохраненные курсы <targets> в отношение <currency> или None, если их нет."""
+
+    snapshot = last_known_snapshot_queryset(currency).first()
+    if snapshot is None:
+        return None
+    rates = {rate.code: rate.currency_rate for rate in snapshot.rates.filter(code__in=targets)}
+    if len(rates) != len(targets):
+        return None
+    return StaleRates(rates, fetched_at=snapshot.fetched_at)
+
+
+async def aget_last_known_rates(currency, targets):
+    """Асинхронный вариант get_last_known_rates."""
+
+    snapshot = await last_known_snapshot_queryset(currency).afirst()
+    if snapshot is None:
+        return None
+    rates = {rate.code: rate.currency_rate async for rate in snapshot.rates.filter(code__in=targets)}
+    if len(rates) != len(targets):
+        return None
+    return StaleRates(rates, fetched_at=snapshot.fetched_at)
 
 
 def get_currency_rate(currency, action_currencies=None):
-    """Функция возвращает актуальные курсы в отношение <currency>."""
+    """Функция возвращает актуальные курсы (Rates) в отношение <currency>, вычисленные по общей матрице курсов. Если
+    провайдер курсов недоступен, возвращаются последние сохраненные курсы (StaleRates)."""
 
     if action_currencies is None:
-        action_currencies = ['GBP', 'USD', 'EUR', 'CNY']
+        action_currencies = list(settings.RATE_CURRENCIES)
         if currency not in action_currencies:
             return None
         action_currencies.remove(currency.upper())
-    symbols = ','.join(action_currencies)
-    url = "https://api.apilayer.com/exchangerates_data/latest"
-    param = {
-        "symbols": symbols,
-        "base": currency,
-    }
-    response = requests.get(url, headers={'apikey': API_KEY}, params=param)
-    if response.ok:
-        return response.json().get('rates')
-    else:
-        return None
+    matrix = get_rate_matrix([*settings.RATE_CURRENCIES, currency, *action_currencies])
+    if matrix is None or not all(code in matrix for code in [currency, *action_currencies]):
+        return get_last_known_rates(currency, action_currencies)
+    return Rates(matrix.rates_for(currency, action_currencies), fetched_at=matrix.fetched_at)
+
+
+async def aget_currency_rate(currency, action_currencies=None):
+    """Асинхронный вариант get_currency_rate."""
+
+    if action_currencies is None:
+        action_currencies = list(settings.RATE_CURRENCIES)
+        if currency not in action_currencies:
+            return None
+        action_currencies.remove(currency.upper())
+    matrix = await aget_rate_matrix([*settings.RATE_CURRENCIES, currency, *action_currencies])
+    if matrix is None or not all(code in matrix for code in [currency, *action_currencies]):
+        return await aget_last_known_rates(currency, action_currencies)
+    return Rates(matrix.rates_for(currency, action_currencies), fetched_at=matrix.fetched_at)
+
+
+def save_rate_snapshot(base, rates):
+    """Функция возвращает общий снимок курсов <rates> в отношение <base>. Снимок с тем же временем получения
+    переиспользуется, поэтому все объекты Converter, созданные по одному ответу apilayer, ссылаются на одни и те же
+    объекты CurrencyRate. Курсы нового снимка добавляются в историю курсов, а после фиксации транзакции
+    увеличивается общая версия таблиц курсов: новый снимок становится последним для всех пользователей."""
+
+    with transaction.atomic(savepoint=False):
+        snapshot, created = RateSnapshot.objects.get_or_create(base=base.upper(), fetched_at=rates.fetched_at)
+        if created:
+            CurrencyRate.objects.bulk_create(
+                CurrencyRate(snapshot=snapshot, code=code, currency_rate=rate) for code, rate in rates.items()
+            )
+            record_rate_history(snapshot.base, rates, snapshot.fetched_at)
+            transaction.on_commit(rate_table.invalidate)
+    return snapshot
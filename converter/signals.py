@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from converter.models import Converter
+from converter.rate_table import rate_table
+
+
+@receiver((post_save, post_delete), sender=Converter)
+def invalidate_rate_table(sender, instance, **kwargs):
+    """После сохранения или удаления объекта Converter устаревает таблица курсов его владельца. Версия
+    пользователя увеличивается после фиксации транзакции, чтобы другие процессы не загрузили прежние курсы под
+    новой версией."""
+
+    transaction.on_commit(lambda: rate_table.invalidate(instance.converter_user_id))
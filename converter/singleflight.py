@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from redis.exceptions import LockError
+
+from converter.cache import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Объединение одновременных запросов внутри процесса: первый вызов с ключом <key> выполняет функцию, а
+    остальные вызовы с тем же ключом ждут его результат."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+
+    def do(self, key, fn):
+        """Метод возвращает результат <fn>, выполняя ее не более одного раза для одновременных вызовов с <key>."""
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    async def ado(self, key, afn):
+        """Асинхронный вариант do: одновременные корутины с <key> в одном цикле событий ждут одну задачу."""
+
+        task_key = (id(asyncio.get_running_loop()), key)
+        task = self._tasks.get(task_key)
+        if task is None:
+            task = asyncio.ensure_future(afn())
+            self._tasks[task_key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(task_key, None))
+        return await asyncio.shield(task)
+
+
+class CacheLock:
+    """Блокировка в кэше Django для кэшей, отличных от Redis, с тем же интерфейсом, что и redis-py Lock.
+    Блокировка снимается, только если в кэше все еще записан токен владельца."""
+
+    def __init__(self, cache, name, timeout):
+        self.cache = cache
+        self.name = name
+        self.timeout = timeout
+        self.token = None
+
+    def acquire(self, blocking=False, token=None):
+        if self.cache.add(self.name, token, timeout=self.timeout):
+            self.token = token
+            return True
+        return False
+
+    def release(self):
+        if self.token is None or self.cache.get(self.name) != self.token:
+            raise LockError('Блокировка принадлежит другому владельцу.')
+        self.cache.delete(self.name)
+
+
+class RedisSingleFlight(SingleFlight):
+    """Объединение запросов между воркерами через блокировку в общем кэше. Внутри процесса запросы сначала
+    объединяются как в SingleFlight, затем один вызов на процесс конкурирует за блокировку. Владелец блокировки
+    выполняет функцию и публикует результат под ключом со своим токеном, остальные воркеры ждут результат того
+    владельца, которого застали. Блокировка снимается только владельцем: в Redis через redis-py Lock, в остальных
+    кэшах — после сравнения токена."""
+
+    def __init__(self, alias=None, lock_timeout=None, wait_timeout=None, poll_interval=0.05):
+        super().__init__()
+        self.alias = alias or settings.RATE_CACHE_ALIAS
+        self.lock_timeout = lock_timeout or settings.RATE_SINGLEFLIGHT_LOCK_TIMEOUT
+        self.wait_timeout = wait_timeout or settings.RATE_SINGLEFLIGHT_WAIT_TIMEOUT
+        self.poll_interval = poll_interval
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def do(self, key, fn):
+        return super().do(key, lambda: self._distributed(key, fn))
+
+    async def ado(self, key, afn):
+        return await super().ado(key, lambda: self._adistributed(key, afn))
+
+    @staticmethod
+    def result_key(key, token):
+        return f'singleflight:result:{key}:{token}'
+
+    def _acquire(self, lock_key):
+        """Метод пытается захватить блокировку без ожидания и возвращает (блокировка, токен) или None."""
+
+        token = uuid.uuid4().hex
+        client = get_redis_client(self.alias)
+        if client is None:
+            lock = CacheLock(self.cache, lock_key, self.lock_timeout)
+        else:
+            lock = client.lock(self.cache.make_and_validate_key(lock_key), timeout=self.lock_timeout)
+        return (lock, token) if lock.acquire(blocking=False, token=token) else None
+
+    def _owner(self, lock_key):
+        """Метод возвращает токен текущего владельца блокировки или None, если блокировка свободна."""
+
+        client = get_redis_client(self.alias)
+        if client is None:
+            return self.cache.get(lock_key)
+        owner = client.get(self.cache.make_and_validate_key(lock_key))
+        return owner.decode() if owner is not None else None
+
+    @staticmethod
+    def _release(lock):
+        """Метод снимает блокировку, только если она все еще принадлежит этому вызову. Если блокировка истекла и ее
+        захватил другой воркер, то она остается за ним."""
+
+        try:
+            lock.release()
+        except LockError:
+            logger.warning('Блокировка %s истекла до завершения запроса.', lock.name)
+
+    def _distributed(self, key, fn):
+        lock_key = f'singleflight:lock:{key}'
+        deadline = time.monotonic() + self.wait_timeout
+        owner = None
+        while True:
+            # Результат читается только у владельца блокировки, застанного во время ожидания, поэтому ответ
+            # прошлого запроса не возвращается
+            if owner is not None:
+                result = self.cache.get(self.result_key(key, owner), MISSING)
+                if result is not MISSING:
+                    return result
+            acquired = self._acquire(lock_key)
+            if acquired is not None:
+                lock, token = acquired
+                result = None
+                try:
+                    result = fn()
+                    return result
+                finally:
+                    # При ошибке публикуется None, чтобы остальные воркеры не ждали до <wait_timeout>
+                    self.cache.set(self.result_key(key, token), result, timeout=self.lock_timeout)
+                    self._release(lock)
+            owner = self._owner(lock_key) or owner
+            if time.monotonic() > deadline:
+                return fn()
+            time.sleep(self.poll_interval)
+
+    async def _adistributed(self, key, afn):
+        lock_key = f'singleflight:lock:{key}'
+        deadline = time.monotonic() + self.wait_timeout
+        owner = None
+        while True:
+            if owner is not None:
+                result = await self.cache.aget(self.result_key(key, owner), MISSING)
+                if result is not MISSING:
+                    return result
+            acquired = await sync_to_async(self._acquire)(lock_key)
+            if acquired is not None:
+                lock, token = acquired
+                result = None
+                try:
+                    result = await afn()
+                    return result
+                finally:
+                    await self.cache.aset(self.result_key(key, token), result, timeout=self.lock_timeout)
+                    await sync_to_async(self._release)(lock)
+            owner = await sync_to_async(self._owner)(lock_key) or owner
+            if time.monotonic() > deadline:
+                return await afn()
+            await asyncio.sleep(self.poll_interval)
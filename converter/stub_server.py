@@ -0,0 +1,66 @@
+import json
+import random
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from converter.providers import FakeRateProvider
+
+
+class RateStubHandler(BaseHTTPRequestHandler):
+    """Обработчик, повторяющий формат ответа apilayer /exchangerates_data/latest."""
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.delay())
+
+        if server.random.random() < server.error_rate:
+            self.send_json(503, {'message': 'Service Unavailable'})
+            return
+
+        query = parse_qs(urlparse(self.path).query)
+        base = query.get('base', ['EUR'])[0].upper()
+        symbols = [code for code in query.get('symbols', [''])[0].split(',') if code]
+        rates = server.provider.build_rates(base, symbols)
+        self.send_json(200, {
+            'success': True,
+            'timestamp': int(time.time()),
+            'base': base,
+            'date': date.today().isoformat(),
+            'rates': {code: float(rate) for code, rate in rates.items()},
+        })
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RateStubServer(ThreadingHTTPServer):
+    """Локальный сервер-заглушка apilayer с настраиваемыми задержкой <latency>, разбросом <jitter> (в секундах) и
+    долей ошибок <error_rate>. Позволяет нагружать пути создания и обновления без обращения к apilayer."""
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        super().__init__(address, RateStubHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.provider = FakeRateProvider(latency=0)
+
+    def delay(self):
+        return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/exchangerates_data/latest'
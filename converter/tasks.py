@@ -0,0 +1,67 @@
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from converter.bulk import convert_rows, read_rows
+from converter.history import ensure_rate_history_partitions
+from converter.models import ConversionJob, ConversionJobChunk, Converter
+from converter.rate_table import rate_table
+from converter.services import Rates, refresh_rate_matrix, save_rate_snapshot
+
+
+@shared_task
+def refresh_currency_rates():
+    """Задача обновляет курсы всех используемых базовых валют. Матрица курсов запрашивается у apilayer один раз,
+    после чего для каждой базовой валюты сохраняется один общий снимок курсов. Объекты Converter не изменяются:
+    курсы читаются из последнего снимка базовой валюты. Возвращает количество сохраненных снимков."""
+
+    codes = set(Converter.objects.values_list('code', flat=True).distinct())
+    matrix = refresh_rate_matrix(settings.RATE_CURRENCIES)
+    if matrix is None or not codes:
+        return 0
+
+    bases = codes & set(matrix.currencies)
+    with transaction.atomic():
+        for base in bases:
+            save_rate_snapshot(base, Rates(matrix.rates_for(base), fetched_at=matrix.fetched_at))
+    return len(bases)
+
+
+@shared_task
+def create_rate_history_partitions():
+    """Задача заранее создает месячные секции таблицы истории курсов. Возвращает количество созданных секций."""
+
+    return ensure_rate_history_partitions()
+
+
+@shared_task
+def run_conversion_job(job_id):
+    """Задача конвертирует загруженный файл пачками. После каждой пачки результаты сохраняются, а счетчики
+    обработанных строк обновляются, поэтому ход выполнения виден до окончания задачи."""
+
+    job = ConversionJob.objects.select_related('user').get(pk=job_id)
+    if job.status != ConversionJob.PENDING:
+        return job.rows_done
+    ConversionJob.objects.filter(pk=job.pk).update(status=ConversionJob.RUNNING, started_at=timezone.now())
+
+    try:
+        rates = rate_table.get_table(job.user_id)
+        with job.file.open('rb') as file:
+            for index, chunk in enumerate(convert_rows(read_rows(file, job.input_format), rates)):
+                with transaction.atomic():
+                    ConversionJobChunk.objects.create(job=job, index=index, rows=chunk)
+                    ConversionJob.objects.filter(pk=job.pk).update(
+                        rows_done=F('rows_done') + len(chunk),
+                        rows_failed=F('rows_failed') + sum(row['error'] is not None for row in chunk),
+                        chunks=F('chunks') + 1,
+                    )
+    except Exception as error:
+        ConversionJob.objects.filter(pk=job.pk).update(status=ConversionJob.FAILED, error=str(error),
+                                                       finished_at=timezone.now())
+        raise
+
+    ConversionJob.objects.filter(pk=job.pk).update(status=ConversionJob.DONE, finished_at=timezone.now())
+    job.refresh_from_db(fields=['rows_done'])
+    return job.rows_done
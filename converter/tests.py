@@ -1,6 +1,44 @@
+import asyncio
+import io
+import json
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, ROUND_CEILING, ROUND_DOWN, ROUND_FLOOR, ROUND_HALF_DOWN, ROUND_HALF_EVEN, \
+    ROUND_HALF_UP, ROUND_UP
+from unittest import mock
+
+import httpx
+import msgpack
+import numpy as np
+import requests
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
-
-from converter.models import Converter, CurrencyRate
+from rest_framework.exceptions import ValidationError
+
+from config.parsers import ORJSONParser
+from config.renderers import MessagePackRenderer, ORJSONRenderer
+from converter.breaker import CircuitBreaker, CircuitOpenError
+from converter.bulk import convert_rows
+from converter.cache import RateCache
+from converter.history import get_rate_series, rate_series, record_rate_history
+from converter.matrix import RateMatrix
+from converter.models import Converter, CurrencyRate, RateHistory, RateSnapshot
+from converter.money import CURRENCIES, Currency, Money, convert_minor, convert_minor_array, scale_rate
+from converter.payloads import converter_payloads, converter_rows
+from converter.providers import ApilayerRateProvider, BaseRateProvider, FakeRateProvider
+from converter.rate_table import RateTable, rate_table
+from converter.serializers import ConverterDetailSerializer, ConverterSerializer
+from converter.services import Rates, get_currency_rate, rate_breaker, save_rate_snapshot
+from converter.singleflight import RedisSingleFlight, SingleFlight
+from converter.stub_server import RateStubServer
+from converter.tasks import refresh_currency_rates, run_conversion_job
 from users.tests import UserModelTestCase
 
 
@@ -9,6 +47,13 @@ class ConverterModelTestCase(UserModelTestCase):
     def setUp(self) -> None:
         super().setUp()
 
+        # Таблицы курсов пользователей и состояние предохранителя не должны переходить между тестами
+        cache.clear()
+        rate_table.clear()
+        rate_series.clear()
+        rate_breaker.reset()
+        self.addCleanup(rate_breaker.reset)
+
         # Создание объектов Converter
         self.converter_1 = Converter.objects.create(
             title='Доллар',
@@ -74,6 +119,70 @@ class ConverterCreateTestCase(ConverterModelTestCase):
             CurrencyRate.objects.count() == 3
         )
 
+    def test_create_converter_runs_fixed_number_of_queries(self):
+        """Снимок курсов и объект Converter сохраняются фиксированным числом запросов в одной транзакции."""
+
+        serializer = ConverterSerializer(data=self.converter_create_data)
+        self.assertTrue(serializer.is_valid())
+        rates_data = Rates({'USD': Decimal('1.25'), 'EUR': Decimal('1.16'), 'CNY': Decimal('9.07')},
+                           fetched_at=timezone.now())
+
+        # Транзакция, поиск снимка, вставка снимка, курсов, истории курсов и объекта Converter
+        with self.assertNumQueries(9):
+            converter = serializer.save(rates_data=rates_data)
+
+        # Проверка сохраненных курсов
+        self.assertEqual(converter.rates.count(), 3)
+
+    def test_database_rejects_duplicate_converter(self):
+        """Повторный объект Converter не создается базой данных, даже если проверка в сериализаторе пройдена."""
+
+        serializer = ConverterSerializer(data={'title': 'Доллар', 'code': 'USD', 'converter_user': 'test@test.com'})
+        with mock.patch.object(ConverterSerializer, 'validate', lambda self, attrs: attrs):
+            self.assertTrue(serializer.is_valid())
+        rates_data = Rates({'EUR': Decimal('0.925926'), 'GBP': Decimal('0.796296'), 'CNY': Decimal('7.222222')},
+                           fetched_at=timezone.now())
+
+        # Объект, созданный параллельным запросом, не дублируется, а снимок курсов откатывается вместе с транзакцией
+        with self.assertRaises(ValidationError) as error:
+            serializer.save(rates_data=rates_data)
+        self.assertEqual(error.exception.detail, {'unique_code': ['Вы уже добавляли валюту для конвертации.']})
+        self.assertEqual(Converter.objects.filter(code='USD', converter_user=self.user_test).count(), 1)
+        self.assertEqual(RateSnapshot.objects.count(), 0)
+
+    def test_duplicate_is_reported_before_fetching_rates(self):
+        """Повторный объект отклоняется до запроса курсов: при недоступном провайдере возвращается unique_code."""
+
+        with mock.patch('converter.services.get_rate_provider') as get_rate_provider:
+            get_rate_provider.return_value.get_rates.return_value = None
+            response = self.client.post(
+                self.sale_create_url,
+                {'title': 'Доллар', 'code': 'usd', 'converter_user': 'test@test.com'},
+                headers=self.headers_user_1,
+                format='json'
+            )
+
+        # Проверка статус кода, содержимого ответа и обращений к провайдеру курсов
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {'unique_code': ['Вы уже добавляли валюту для конвертации.']})
+        get_rate_provider.return_value.get_rates.assert_not_called()
+
+    def test_failed_fetch_does_not_create_converter(self):
+        """Если курсы валют не получены, то объект Converter не создается."""
+
+        with mock.patch('converter.serializers.get_currency_rate', return_value=None):
+            response = self.client.post(
+                self.sale_create_url,
+                self.converter_create_data,
+                headers=self.headers_user_1,
+                format='json'
+            )
+
+        # Проверка статус кода и количества объектов
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Converter.objects.count(), 2)
+        self.assertEqual(RateSnapshot.objects.count(), 0)
+
     def test_user_cannot_create_converter_without_authentication(self):
         """Неавторизованные пользователи не могут создавать объекты Converter."""
 
@@ -202,15 +311,7 @@ class ConverterCreateTestCase(ConverterModelTestCase):
             'converter_user': 'test@test.com',
         }
 
-        # Создание объекта Converter
-        self.converter_1_copy = Converter.objects.create(
-            title='Доллар',
-            code='USD',
-            converter_user=self.user_test,
-        )
-        self.converter_1_copy.save()
-
-        # POST-запрос на создание объекта
+        # POST-запрос на создание объекта. Объект Converter с валютой USD у пользователя уже есть
         response = self.client.post(
             self.sale_create_url,
             self.converter_create_data_1,
@@ -226,7 +327,7 @@ class ConverterCreateTestCase(ConverterModelTestCase):
 
         # Количество объектов после создания
         self.assertTrue(
-            Converter.objects.count() == 3
+            Converter.objects.count() == 2
         )
 
         # Количество валют для конвертации после создания
@@ -316,6 +417,191 @@ class ConverterGetDetailTestCase(ConverterModelTestCase):
         )
 
 
+class ConverterPayloadTestCase(ConverterModelTestCase):
+    """Тестирование сборки ответа из строк values() без ConverterDetailSerializer."""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        # Запросы на создание тестовых объектов
+        for title, code in (('Йены', 'CNY'), ('Фунты', 'GBP')):
+            self.client.post(
+                '/converter/create/',
+                {'title': title, 'code': code, 'converter_user': 'test@test.com'},
+                headers=self.headers_user_1,
+                format='json'
+            )
+
+    def test_payload_matches_detail_serializer(self):
+        """Ответ совпадает с ConverterDetailSerializer, курсы всех объектов выбираются одним запросом."""
+
+        queryset = Converter.objects.filter(converter_user=self.user_test).order_by('pk')
+        with self.assertNumQueries(2):
+            payloads = converter_payloads(converter_rows(queryset))
+        self.assertEqual(payloads, ConverterDetailSerializer(queryset, many=True).data)
+        self.assertEqual([len(payload['rate']) for payload in payloads], [0, 3, 3])
+
+    def test_detail_uses_two_queries(self):
+        """Детальная информация владельцу отдается запросом объекта с почтой владельца и запросом курсов."""
+
+        converter = Converter.objects.get(code='CNY', converter_user=self.user_test)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/converter/{converter.pk}/', headers=self.headers_user_1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), ConverterDetailSerializer(converter).data)
+        self.assertEqual(sum('converter_' in query['sql'] for query in queries), 2)
+
+
+class ConverterConditionalGetTestCase(ConverterModelTestCase):
+    """Тестирование условных GET-запросов к объектам модели Converter."""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        # Запрос на создание тестового объекта
+        self.client.post(
+            '/converter/create/',
+            {'title': 'Йены', 'code': 'CNY', 'converter_user': 'test@test.com'},
+            headers=self.headers_user_1,
+            format='json'
+        )
+        self.converter_test_object = Converter.objects.get(code='CNY', converter_user=self.user_test)
+        self.converter_detail_url = f'/converter/{self.converter_test_object.pk}/'
+
+    def get_detail(self, headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.converter_detail_url, headers=headers)
+        return response, [query['sql'] for query in queries]
+
+    def test_unchanged_converter_returns_not_modified(self):
+        """Если объект не изменился, то возвращается 304 без загрузки курсов."""
+
+        response, _ = self.get_detail(self.headers_user_1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+
+        for condition in ({'If-None-Match': etag}, {'If-Modified-Since': last_modified}):
+            response, queries = self.get_detail({**self.headers_user_1, **condition})
+
+            # Проверка статус кода и запросов к базе данных
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response.headers['ETag'], etag)
+            self.assertEqual(sum('converter_' in query for query in queries), 1)
+
+    def test_changed_converter_returns_new_representation(self):
+        """После обновления курсов объект отдается заново с новым ETag."""
+
+        response, _ = self.get_detail(self.headers_user_1)
+        etag = response.headers['ETag']
+        Converter.objects.filter(pk=self.converter_test_object.pk).update(changed=timezone.now())
+
+        response, _ = self.get_detail({**self.headers_user_1, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(len(response.json()['rate']), 3)
+
+    def test_new_rates_snapshot_returns_new_representation(self):
+        """После сохранения нового снимка курсов базовой валюты объект отдается заново, хотя сам не изменился."""
+
+        response, _ = self.get_detail(self.headers_user_1)
+        etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+        rates = Rates({'USD': Decimal('0.2'), 'EUR': Decimal('0.1'), 'GBP': Decimal('0.05')},
+                      fetched_at=timezone.now() + timedelta(seconds=1))
+        save_rate_snapshot('CNY', rates)
+
+        for condition in ({'If-None-Match': etag}, {'If-Modified-Since': last_modified}):
+            response, _ = self.get_detail({**self.headers_user_1, **condition})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn({'code': 'USD', 'currency_rate': '0.200000'}, response.json()['rate'])
+
+    def test_other_user_cannot_use_etag(self):
+        """Чужой пользователь не получает 304 и остается без доступа к объекту."""
+
+        response, _ = self.get_detail(self.headers_user_1)
+        response, _ = self.get_detail({**self.headers_user_2, 'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ConverterListTestCase(ConverterModelTestCase):
+    """Тестирование списка объектов модели Converter с постраничным выводом по курсору."""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        # Получение маршрута
+        self.converter_list_url = '/converter/'
+
+        # Запросы на создание тестовых объектов
+        for title, code in (('Евро', 'EUR'), ('Фунты', 'GBP'), ('Йены', 'CNY')):
+            self.client.post(
+                '/converter/create/',
+                {'title': title, 'code': code, 'converter_user': 'test@test.com'},
+                headers=self.headers_user_1,
+                format='json'
+            )
+
+    def get_list(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params, headers=self.headers_user_1)
+        return response, len(queries)
+
+    def test_list_returns_only_own_converters(self):
+        """Список содержит только объекты текущего пользователя, новые объекты идут первыми."""
+
+        response, _ = self.get_list(self.converter_list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual([result['code'] for result in results], ['CNY', 'GBP', 'EUR', 'USD'])
+        self.assertEqual({result['converter_user'] for result in results}, {'test@test.com'})
+        self.assertEqual(len(results[0]['rate']), 3)
+        self.assertEqual(results[-1]['rate'], [])
+
+    def test_page_cost_does_not_depend_on_depth(self):
+        """Каждая страница выбирается одинаковым числом запросов, курсы загружаются одним запросом."""
+
+        url, codes, counts = self.converter_list_url, [], []
+        params = {'page_size': 1}
+        while url:
+            response, count = self.get_list(url, **params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            codes.extend(result['code'] for result in response.json()['results'])
+            counts.append(count)
+            url, params = response.json()['next'], {}
+
+        self.assertEqual(codes, ['CNY', 'GBP', 'EUR', 'USD'])
+        self.assertEqual(len(set(counts[:-1])), 1)
+        self.assertLessEqual(counts[-1], counts[0])
+
+    def test_fields_limit_columns_and_queries(self):
+        """Параметр fields ограничивает поля ответа, курсы без поля rate не загружаются."""
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.converter_list_url, {'fields': 'id,code'}, headers=self.headers_user_1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'code'})
+        self.assertFalse(any('converter_currencyrate' in query['sql'] for query in queries))
+        self.assertFalse(any('"converter_converter"."title"' in query['sql'] for query in queries))
+
+    def test_unknown_fields(self):
+        """Если ни одно из полей fields не существует, то возвращается ошибка."""
+
+        response = self.client.get(self.converter_list_url, {'fields': 'password'}, headers=self.headers_user_1)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ordering_by_changed(self):
+        """Список можно отсортировать по дате изменения."""
+
+        Converter.objects.filter(pk=self.converter_1.pk).update(changed=timezone.now())
+        response, _ = self.get_list(self.converter_list_url, ordering='-changed')
+        self.assertEqual(response.json()['results'][0]['code'], 'USD')
+
+    def test_anonymous_user(self):
+        """Анонимный пользователь не получает список."""
+
+        response = self.client.get(self.converter_list_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
 class ConverterUpdateTestCase(ConverterModelTestCase):
     def setUp(self) -> None:
         super().setUp()
@@ -623,3 +909,1199 @@ class ConverterGetCurrencyRateTestCase(ConverterModelTestCase):
             response.json(),
             {'converter_user': 'Пользователь не добавил текущую валюту для конвертации.'}
         )
+
+
+class ConverterGetCurrencyRateBatchTestCase(ConverterModelTestCase):
+    """Тестирование пакетной конвертации валют."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+
+        # Добавление маршрутов
+        self.get_currency_rate_batch = '/converter/get_rate/batch/'
+
+        # Запрос на создание тестового объекта
+        self.client.post(
+            '/converter/create/',
+            {'title': 'Йены', 'code': 'CNY', 'converter_user': 'test@test.com'},
+            headers=self.headers_user_1,
+            format='json'
+        )
+
+    def post_conversions(self, conversions):
+        rate_table.clear()
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                self.get_currency_rate_batch,
+                {'conversions': conversions},
+                headers=self.headers_user_1,
+                format='json'
+            )
+        return response, len(queries)
+
+    def test_user_can_get_currency_rates_in_batch(self):
+        """Результаты возвращаются в порядке запроса, ошибки — для каждой конвертации отдельно."""
+
+        response, _ = self.post_conversions([
+            {'base_currency': 'CNY', 'target_currency': 'USD', 'amount': '200'},
+            {'base_currency': 'GBP', 'target_currency': 'USD', 'amount': '1'},
+            {'base_currency': 'AMD', 'target_currency': 'USD', 'amount': '1'},
+            {'base_currency': 'cny', 'target_currency': 'eur', 'amount': '10'},
+        ])
+
+        # Проверка статус кода и содержимого ответа
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual(results[0], {'converter': '200 CNY = 27.692400 USD'})
+        self.assertEqual(results[1], {'errors': {
+            'converter_user': 'Пользователь не добавил текущую валюту для конвертации.'
+        }})
+        self.assertEqual(results[2], {'errors': {
+            'wrong_code': ['Необходимо использовать только актуальные курсы валют.']
+        }})
+        self.assertEqual(results[3], {'converter': '10 cny = 1.282050 eur'})
+
+    def test_batch_query_count_does_not_depend_on_size(self):
+        """Количество запросов к базе данных не зависит от количества конвертаций."""
+
+        conversion = {'base_currency': 'CNY', 'target_currency': 'USD', 'amount': '1'}
+        _, queries_one = self.post_conversions([conversion])
+        response, queries_many = self.post_conversions([conversion] * 100)
+
+        # Проверка количества запросов
+        self.assertEqual(len(response.json()['results']), 100)
+        self.assertEqual(queries_one, queries_many)
+
+    def test_user_cannot_send_empty_batch(self):
+        """Пустой список конвертаций не принимается."""
+
+        response, _ = self.post_conversions([])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConverterGetCurrencyRateMatrixTestCase(ConverterModelTestCase):
+    """Тестирование конвертации сумм во все актуальные валюты."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+
+        # Запрос на создание тестового объекта
+        self.client.post(
+            '/converter/create/',
+            {'title': 'Йены', 'code': 'CNY', 'converter_user': 'test@test.com'},
+            headers=self.headers_user_1,
+            format='json'
+        )
+
+    def test_user_can_get_conversion_matrix(self):
+        """Каждая сумма конвертируется во все актуальные валюты одним запросом к курсам."""
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                '/converter/get_rate/matrix/',
+                {'base_currency': 'cny', 'amounts': [1, 200]},
+                headers=self.headers_user_1,
+                format='json'
+            )
+
+        # Проверка статус кода и содержимого ответа
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {
+            'base_currency': 'CNY',
+            'targets': ['EUR', 'GBP', 'USD'],
+            'matrix': [
+                {'amount': 1, 'converted': {'EUR': '0.128205', 'GBP': '0.110256', 'USD': '0.138462'}},
+                {'amount': 200, 'converted': {'EUR': '25.641000', 'GBP': '22.051200', 'USD': '27.692400'}},
+            ]
+        })
+
+        # Курсы выбираются одним запросом
+        self.assertEqual(sum('converter_currencyrate' in query['sql'] for query in queries), 1)
+
+    def test_matrix_in_msgpack(self):
+        """Запрос и ответ в MessagePack совпадают с JSON."""
+
+        data = {'base_currency': 'CNY', 'amounts': [1, 123456789012345678]}
+        json_response = self.client.post('/converter/get_rate/matrix/', data, headers=self.headers_user_1,
+                                         format='json')
+        response = self.client.post('/converter/get_rate/matrix/', data, format='msgpack',
+                                    headers={**self.headers_user_1, 'Accept': 'application/msgpack'})
+
+        # Проверка статус кода и содержимого ответа
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.headers['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), json_response.json())
+        self.assertEqual(json_response.json()['matrix'][1]['converted']['USD'], '17094073920227407.267236')
+
+    def test_renderers_keep_decimal_precision(self):
+        """Decimal кодируется строкой без потери точности в JSON и MessagePack."""
+
+        rate = '0.123456789012345678901234567890'
+        self.assertEqual(json.loads(ORJSONRenderer().render({'rate': Decimal(rate)})), {'rate': rate})
+        self.assertEqual(msgpack.unpackb(MessagePackRenderer().render({'rate': Decimal(rate)})), {'rate': rate})
+
+    def test_big_integers_are_not_truncated(self):
+        """Целые числа вне 64 бит разбираются без перехода к float и кодируются без ошибки в JSON и MessagePack."""
+
+        big = 10 ** 20
+        body = b'{"amounts": [100000000000000000000, 1.5]}'
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(body)), {'amounts': [big, 1.5]})
+        self.assertEqual(json.loads(ORJSONRenderer().render({'amount': big})), {'amount': big})
+        self.assertEqual(msgpack.unpackb(MessagePackRenderer().render({'matrix': [{'amount': big}]})),
+                         {'matrix': [{'amount': str(big)}]})
+
+    def test_user_cannot_convert_amounts_outside_int64(self):
+        """Суммы вне 64 бит не принимаются: ответ 400, а не ошибка сервера."""
+
+        for amounts in (['100000000000000000000'], [10 ** 20]):
+            response = self.client.post('/converter/get_rate/matrix/', {'base_currency': 'CNY', 'amounts': amounts},
+                                        headers=self.headers_user_1, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('amounts', response.json())
+
+    def test_malformed_msgpack(self):
+        """Некорректное тело запроса в MessagePack возвращает 400."""
+
+        response = self.client.post('/converter/get_rate/matrix/', b'\xc1', content_type='application/msgpack',
+                                    headers=self.headers_user_1)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_user_cannot_get_matrix_without_converter(self):
+        """Если пользователь не добавил базовую валюту, то возвращается ошибка."""
+
+        response = self.client.post(
+            '/converter/get_rate/matrix/',
+            {'base_currency': 'GBP', 'amounts': [1]},
+            headers=self.headers_user_1,
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RateTableTestCase(ConverterModelTestCase):
+    """Тестирование таблиц курсов пользователей."""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        # Запрос на создание тестового объекта
+        self.client.post(
+            '/converter/create/',
+            {'title': 'Йены', 'code': 'CNY', 'converter_user': 'test@test.com'},
+            headers=self.headers_user_1,
+            format='json'
+        )
+
+    def test_warm_conversion_does_not_query_database(self):
+        """Конвертация с прогретой таблицей курсов не обращается к базе данных."""
+
+        self.assertEqual(rate_table.get(self.user_test.pk, 'CNY', 'USD'), Decimal('0.138462'))
+        with self.assertNumQueries(0):
+            self.assertEqual(rate_table.get(self.user_test.pk, 'cny', 'usd'), Decimal('0.138462'))
+            self.assertIsNone(rate_table.get(self.user_test.pk, 'GBP', 'USD'))
+
+        # Прогретая таблица второго уровня читается без обращения к базе данных
+        rate_table.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(rate_table.get(self.user_test.pk, 'CNY', 'EUR'), Decimal('0.128205'))
+
+    def test_get_rate_view_reads_rate_table(self):
+        """Конвертация через get_rate не обращается к курсам в базе данных."""
+
+        rate_table.get_table(self.user_test.pk)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                '/converter/get_rate/',
+                {'base_currency': 'CNY', 'target_currency': 'USD', 'amount': '200'},
+                headers=self.headers_user_1,
+                format='json'
+            )
+
+        # Проверка содержимого ответа и запросов к базе данных: пользователь берется из токена
+        self.assertEqual(response.json(), {'converter': '200 CNY = 27.692400 USD'})
+        self.assertFalse([query for query in queries if 'converter_' in query['sql']])
+        self.assertEqual(len(queries), 0)
+
+    def test_converter_save_invalidates_rate_table(self):
+        """Сохранение объекта Converter увеличивает версию таблицы курсов только его владельца."""
+
+        # Снимок курсов GBP уже сохранен при создании объекта другим пользователем
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                '/converter/create/',
+                {'title': 'Фунты', 'code': 'GBP', 'converter_user': 'another@test.com'},
+                headers=self.headers_user_2,
+                format='json'
+            )
+        self.assertIsNone(rate_table.get(self.user_test.pk, 'GBP', 'USD'))
+        rate_table.get_table(self.user_2.pk)
+        version = rate_table.version
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                '/converter/create/',
+                {'title': 'Фунты', 'code': 'GBP', 'converter_user': 'test@test.com'},
+                headers=self.headers_user_1,
+                format='json'
+            )
+
+        # Проверка версий и обновленной таблицы: таблица другого пользователя остается в LRU процесса
+        self.assertEqual(rate_table.version, version)
+        self.assertEqual(cache.get(rate_table.user_version_key(self.user_test.pk)), 1)
+        self.assertIn(self.user_2.pk, rate_table._local)
+        self.assertEqual(rate_table.get(self.user_test.pk, 'GBP', 'USD'), Decimal('1.255814'))
+        with self.assertNumQueries(0):
+            rate_table.get_table(self.user_2.pk)
+
+    def test_new_snapshot_invalidates_all_rate_tables(self):
+        """Новый снимок курсов становится последним для всех пользователей, поэтому общая версия увеличивается."""
+
+        version = rate_table.version
+        rates = Rates({'USD': Decimal('0.2'), 'EUR': Decimal('0.1'), 'GBP': Decimal('0.05')}, fetched_at=timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            save_rate_snapshot('CNY', rates)
+        self.assertEqual(rate_table.version, version + 1)
+        self.assertEqual(rate_table.get(self.user_test.pk, 'CNY', 'USD'), Decimal('0.2'))
+
+    def test_broadcast_user_version_clears_only_user_table(self):
+        """Версия пользователя, полученная от другого процесса, удаляет из LRU процесса только его таблицу."""
+
+        rate_table.get_table(self.user_test.pk)
+        rate_table.get_table(self.user_2.pk)
+        rate_table._apply_message(f'{self.user_test.pk}:5'.encode())
+        self.assertEqual(list(rate_table._local), [self.user_2.pk])
+
+        # Таблица, загруженная с прежней версией пользователя, не запоминается
+        rate_table._remember(rate_table.version, self.user_test.pk, 4, {})
+        self.assertNotIn(self.user_test.pk, rate_table._local)
+
+    def test_broadcast_version_clears_local_tables(self):
+        """Версия, полученная от другого процесса, очищает LRU процесса."""
+
+        rate_table.get_table(self.user_test.pk)
+        rate_table._apply_version(str(rate_table.version + 1).encode())
+
+        # Таблица с прежней версией не используется
+        with self.assertNumQueries(1):
+            rate_table.get_table(self.user_test.pk)
+
+    def test_lru_evicts_oldest_tables(self):
+        """LRU процесса хранит не более <maxsize> таблиц."""
+
+        table = RateTable(maxsize=2, loader=lambda user_id: {('EUR', 'USD'): Decimal(user_id)})
+        for user_id in (1, 2, 1, 3):
+            table.get_table(user_id)
+        self.assertEqual(list(table._local), [1, 3])
+
+    def test_tables_expire_without_shared_cache(self):
+        """Без Redis таблица, устаревшая в другом процессе, обновляется не позже истечения записи первого уровня."""
+
+        caches_setting = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'worker_1': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'worker_1'},
+            'worker_2': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'worker_2'},
+        }
+        rates = {('EUR', 'USD'): Decimal('1.08')}
+        with override_settings(CACHES=caches_setting):
+            worker_1, worker_2 = (RateTable(alias=alias, local_timeout=0.05, loader=lambda user_id: dict(rates))
+                                  for alias in ('worker_1', 'worker_2'))
+            self.assertEqual(worker_2.get(1, 'EUR', 'USD'), Decimal('1.08'))
+
+            # Объект Converter сохранен в первом процессе, версия до второго процесса не доходит
+            rates[('GBP', 'USD')] = Decimal('1.25')
+            worker_1.invalidate(1)
+            self.assertIsNone(worker_2.get(1, 'GBP', 'USD'))
+
+            # После истечения записи первого уровня второй уровень тоже не отдает прежнюю таблицу
+            time.sleep(0.06)
+            self.assertEqual(worker_2.get(1, 'GBP', 'USD'), Decimal('1.25'))
+
+    def test_redis_client_is_created_once_per_process(self):
+        """Клиент Redis для рассылки версий создается один раз, а не при каждом сохранении объекта Converter."""
+
+        caches_setting = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'rate_table_redis': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                                 'LOCATION': 'redis://127.0.0.1:6399/0'},
+        }
+        with override_settings(CACHES=caches_setting), mock.patch('redis.Redis.from_url') as from_url:
+            table = RateTable(alias='rate_table_redis')
+            clients = {id(table._redis_client()) for _ in range(3)}
+        self.assertEqual(len(clients), 1)
+        self.assertEqual(from_url.call_count, 1)
+
+
+class RateHistoryTestCase(ConverterModelTestCase):
+    """Тестирование истории курсов валют."""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        # Поминутная история курса USD/EUR за три часа
+        self.start = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        RateHistory.objects.bulk_create(
+            RateHistory(base='USD', target='EUR', rate=Decimal(100 + minute % 60) / 100,
+                        observed_at=self.start + timedelta(minutes=minute))
+            for minute in range(180)
+        )
+
+    def get_history(self, **params):
+        return self.client.get('/converter/history/', params, headers=self.headers_user_1)
+
+    def test_history_is_downsampled_by_interval(self):
+        """История прореживается на стороне базы данных: минимальный, максимальный и последний курс интервала."""
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_history(base='usd', target='eur', start=self.start.isoformat(),
+                                        end=(self.start + timedelta(hours=3)).isoformat(), interval='hour')
+
+        # Проверка статус кода и точек истории
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        points = response.json()['points']
+        self.assertEqual(len(points), 3)
+        self.assertEqual({key: points[0][key] for key in ('min', 'max', 'last', 'count')},
+                         {'min': '1.000000', 'max': '1.590000', 'last': '1.590000', 'count': 60})
+
+        # История выбирается двумя запросами независимо от количества строк
+        self.assertEqual(sum('converter_ratehistory' in query['sql'] for query in queries), 2)
+
+    def test_history_limits_number_of_points(self):
+        """Слишком мелкий интервал для длинного периода не принимается."""
+
+        response = self.get_history(base='USD', target='EUR', start=self.start.isoformat(),
+                                    end=(self.start + timedelta(days=365)).isoformat(), interval='minute')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('interval', response.json())
+
+    def test_new_snapshot_is_recorded_to_history(self):
+        """Курсы нового снимка добавляются в историю курсов, повторное сохранение снимка не дублирует историю."""
+
+        rates = Rates({'USD': Decimal('1.25'), 'EUR': Decimal('1.16')}, fetched_at=timezone.now())
+        save_rate_snapshot('GBP', rates)
+        save_rate_snapshot('GBP', rates)
+        self.assertEqual(RateHistory.objects.filter(base='GBP').count(), 2)
+
+
+class ConverterAsOfTestCase(ConverterModelTestCase):
+    """Тестирование конвертации по курсу на указанный момент."""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        # Запрос на создание тестового объекта
+        self.client.post(
+            '/converter/create/',
+            {'title': 'Йены', 'code': 'CNY', 'converter_user': 'test@test.com'},
+            headers=self.headers_user_1,
+            format='json'
+        )
+
+        # История курса CNY/USD
+        self.start = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        RateHistory.objects.bulk_create([
+            RateHistory(base='CNY', target='USD', rate=Decimal('0.1'), observed_at=self.start),
+            RateHistory(base='CNY', target='USD', rate=Decimal('0.2'), observed_at=self.start + timedelta(days=30)),
+        ])
+
+    def test_user_can_convert_as_of_moment(self):
+        """Конвертация использует курс, действовавший в указанный момент."""
+
+        response = self.client.post(
+            '/converter/get_rate/',
+            {'base_currency': 'CNY', 'target_currency': 'USD', 'amount': '200',
+             'as_of': (self.start + timedelta(days=10)).isoformat()},
+            headers=self.headers_user_1,
+            format='json'
+        )
+        self.assertEqual(response.json(), {'converter': '200 CNY = 20.000000 USD'})
+
+    def test_user_cannot_convert_before_history(self):
+        """Если курса на указанный момент нет, то возвращается ошибка."""
+
+        response = self.client.post(
+            '/converter/get_rate/',
+            {'base_currency': 'CNY', 'target_currency': 'USD', 'amount': '200',
+             'as_of': (self.start - timedelta(days=1)).isoformat()},
+            headers=self.headers_user_1,
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {'as_of': 'Нет курса валют на указанный момент.'})
+
+    def test_batch_resolves_moments_with_one_series_query(self):
+        """Пакетная конвертация с разными моментами выбирает ряд курсов пары один раз."""
+
+        conversions = [
+            {'base_currency': 'CNY', 'target_currency': 'USD', 'amount': '1',
+             'as_of': (self.start + timedelta(days=day)).isoformat()}
+            for day in range(-1, 60)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                '/converter/get_rate/batch/',
+                {'conversions': conversions},
+                headers=self.headers_user_1,
+                format='json'
+            )
+
+        # Проверка порядка результатов
+        results = response.json()['results']
+        self.assertEqual(results[0], {'errors': {'as_of': 'Нет курса валют на указанный момент.'}})
+        self.assertEqual(results[1], {'converter': '1 CNY = 0.100000 USD'})
+        self.assertEqual(results[-1], {'converter': '1 CNY = 0.200000 USD'})
+
+        # Проверка количества запросов к истории курсов
+        self.assertEqual(sum('converter_ratehistory' in query['sql'] for query in queries), 1)
+
+    def test_rate_series_lookup_matches_bisect(self):
+        """Поиск за один проход дает те же курсы, что и поиск по каждому моменту отдельно."""
+
+        series = get_rate_series('CNY', 'USD')
+        moments = [self.start + timedelta(hours=hour) for hour in range(1000, -50, -7)]
+        self.assertEqual(series.rates_at(moments), [series.rate_at(moment) for moment in moments])
+
+    def test_rate_series_is_extended_with_new_points(self):
+        """Ряд курсов хранится в процессе, а после записи истории дополняется только новыми точками."""
+
+        series = get_rate_series('CNY', 'USD')
+        with self.assertNumQueries(0):
+            self.assertIs(get_rate_series('cny', 'usd'), series)
+        observed_at = timezone.now() + timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            record_rate_history('CNY', {'USD': Decimal('0.3')}, observed_at)
+
+        # Проверка дополненного ряда: выбираются только точки позже последней
+        with CaptureQueriesContext(connection) as queries:
+            extended = get_rate_series('CNY', 'USD')
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"observed_at" >', queries[0]['sql'])
+        self.assertEqual(len(extended), len(series) + 1)
+        self.assertEqual(extended.rate_at(observed_at), Decimal('0.3'))
+        self.assertEqual(series.rate_at(observed_at), extended.rate_at(observed_at - timedelta(seconds=1)))
+
+
+class MoneyTestCase(TestCase):
+    """Тестирование сумм в дробных единицах и векторной конвертации."""
+
+    def test_money_converts_with_currency_rounding(self):
+        """Сумма конвертируется по курсу и округляется по правилам целевой валюты."""
+
+        money = Money.from_decimal('100.005', 'USD')
+        self.assertEqual(money, Money(10000, 'USD'))
+        self.assertEqual(money.convert('CNY', Decimal('7.222222')), Money(72222, 'CNY'))
+        self.assertEqual(str(Money(-150, 'EUR')), '-1.50 EUR')
+
+        # Курс с точностью больше шести знаков не принимается
+        with self.assertRaises(ValueError):
+            scale_rate(Decimal('1.0000001'))
+
+    def test_array_conversion_matches_decimal_reference(self):
+        """Векторная конвертация совпадает с эталонной конвертацией через Decimal во всех режимах округления."""
+
+        rng = np.random.default_rng(0)
+        minors = np.concatenate([rng.integers(-10 ** 12, 10 ** 12, 5000), np.arange(-50, 51)])
+        for rounding in (ROUND_HALF_EVEN, ROUND_HALF_UP, ROUND_HALF_DOWN, ROUND_DOWN, ROUND_UP, ROUND_FLOOR,
+                         ROUND_CEILING):
+            for base_exponent, target_exponent in ((2, 2), (0, 2), (3, 2)):
+                base = Currency('AAA', base_exponent, rounding)
+                target = Currency('BBB', target_exponent, rounding)
+                for rate_scaled in (500000, 1255814, 7800000):
+                    with self.subTest(rounding=rounding, base=base_exponent, target=target_exponent, rate=rate_scaled):
+                        result = convert_minor_array(minors, rate_scaled, base, target)
+                        self.assertEqual(result.tolist(),
+                                         [convert_minor(int(minor), rate_scaled, base, target) for minor in minors])
+
+    def test_array_conversion_does_not_overflow(self):
+        """Суммы, произведение которых на курс не помещается в int64, конвертируются точно."""
+
+        minors = np.array([10 ** 15, -10 ** 15])
+        result = convert_minor_array(minors, 7800000, CURRENCIES['USD'], CURRENCIES['CNY'])
+        self.assertEqual(result.tolist(), [7800000000000000, -7800000000000000])
+
+    def test_array_conversion_of_amounts_outside_int64(self):
+        """Суммы больше 2 ** 63 не переполняются при построении массива и совпадают с convert_minor."""
+
+        usd, eur = CURRENCIES['USD'], CURRENCIES['EUR']
+        minors = [2 ** 63, 2 ** 63 + 1, -2 ** 63, 10 ** 19, 100]
+        expected = [convert_minor(minor, 925926, usd, eur) for minor in minors]
+        self.assertEqual(convert_minor_array(minors, 925926, usd, eur).tolist(), expected)
+        self.assertEqual(convert_minor_array(np.array(minors[:2], dtype=np.uint64), 925926, usd, eur).tolist(),
+                         expected[:2])
+        self.assertEqual(convert_minor_array(np.array([-2 ** 63]), 925926, usd, eur).tolist(), [expected[2]])
+
+
+class ConverterBulkConvertTestCase(ConverterModelTestCase):
+    """Тестирование потоковой конвертации файлов."""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        # Запрос на создание тестового объекта
+        self.client.post(
+            '/converter/create/',
+            {'title': 'Йены', 'code': 'CNY', 'converter_user': 'test@test.com'},
+            headers=self.headers_user_1,
+            format='json'
+        )
+
+    def upload(self, name, content):
+        response = self.client.post(
+            '/converter/convert/bulk/',
+            {'file': SimpleUploadedFile(name, content.encode())},
+            headers=self.headers_user_1,
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    @override_settings(RATE_BULK_CHUNK_SIZE=2)
+    def test_user_can_convert_csv_file(self):
+        """Строки csv конвертируются пачками, результаты возвращаются в исходном порядке с ошибками по строкам."""
+
+        content = self.upload('ledger.csv', (
+            'base_currency,target_currency,amount\n'
+            'cny,usd,200\n'
+            'GBP,USD,1\n'
+            'CNY,EUR,1.005\n'
+            'CNY,AMD,1\n'
+            'CNY,USD,abc\n'
+        ))
+        self.assertEqual(content.splitlines(), [
+            'base_currency,target_currency,amount,converted,error',
+            'CNY,USD,200,27.69,',
+            'GBP,USD,1,,Пользователь не добавил текущую валюту для конвертации.',
+            'CNY,EUR,1.005,0.13,',
+            'CNY,AMD,1,,Необходимо использовать только актуальные курсы валют.',
+            'CNY,USD,abc,,Сумма должна быть числом.',
+        ])
+
+    def test_user_can_convert_ndjson_file(self):
+        """Строки ndjson конвертируются и возвращаются в формате ndjson."""
+
+        content = self.upload('ledger.ndjson', (
+            '{"base_currency": "CNY", "target_currency": "GBP", "amount": "10"}\n'
+            '\n'
+            'not json\n'
+        ))
+        self.assertEqual([json.loads(line) for line in content.splitlines()], [
+            {'base_currency': 'CNY', 'target_currency': 'GBP', 'amount': '10', 'converted': '1.10', 'error': None},
+            {'base_currency': '', 'target_currency': '', 'amount': None, 'converted': None,
+             'error': 'Необходимо использовать только актуальные курсы валют.'},
+        ])
+
+    def test_converted_rows_match_single_conversion(self):
+        """Результат конвертации файла совпадает с конвертацией каждой суммы по отдельности."""
+
+        rate = rate_table.get(self.user_test.pk, 'CNY', 'USD')
+        amounts = [str(Decimal(amount) / 100) for amount in range(-500, 500, 7)]
+        rows = [{'base_currency': 'CNY', 'target_currency': 'USD', 'amount': amount} for amount in amounts]
+        results = [result for chunk in convert_rows(rows, {('CNY', 'USD'): rate}, chunk_size=10) for result in chunk]
+        self.assertEqual([result['converted'] for result in results],
+                         [str(Money.from_decimal(amount, 'CNY').convert('USD', rate).to_decimal())
+                          for amount in amounts])
+
+    def test_large_amounts_are_converted_exactly(self):
+        """Суммы, дробные единицы которых не помещаются в int64, конвертируются без переполнения."""
+
+        rate = Decimal('0.925926')
+        amounts = ['100000000000000000', '92233720368547758.08', '-92233720368547758.08']
+        rows = [{'base_currency': 'USD', 'target_currency': 'EUR', 'amount': amount} for amount in amounts]
+        results = next(convert_rows(rows, {('USD', 'EUR'): rate}))
+        self.assertEqual([result['converted'] for result in results],
+                         [str(Money.from_decimal(Decimal(amount), 'USD').convert('EUR', rate).to_decimal())
+                          for amount in amounts])
+        self.assertEqual(results[0]['converted'], '92592600000000000.00')
+
+
+@override_settings(RATE_BULK_CHUNK_SIZE=2)
+class ConversionJobTestCase(ConverterModelTestCase):
+    """Тестирование фоновой конвертации файлов."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        # Запрос на создание тестового объекта
+        self.client.post(
+            '/converter/create/',
+            {'title': 'Йены', 'code': 'CNY', 'converter_user': 'test@test.com'},
+            headers=self.headers_user_1,
+            format='json'
+        )
+        self.content = (
+            'base_currency,target_currency,amount\n'
+            'CNY,USD,200\n'
+            'CNY,EUR,1\n'
+            'GBP,USD,1\n'
+        )
+
+    def submit(self):
+        return self.client.post(
+            '/converter/jobs/',
+            {'file': SimpleUploadedFile('ledger.csv', self.content.encode())},
+            headers=self.headers_user_1,
+            format='multipart'
+        )
+
+    def test_user_can_run_conversion_job(self):
+        """Задача ставится в очередь, обрабатывает файл пачками, а результаты отдаются постранично."""
+
+        with mock.patch.object(run_conversion_job, 'delay',
+                               side_effect=lambda pk: run_conversion_job.apply(args=(pk,))) as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.submit()
+
+        # Проверка статус кода и постановки задачи в очередь
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job_id = response.json()['id']
+        delay.assert_called_once_with(job_id)
+
+        # Проверка состояния задачи
+        job = self.client.get(f'/converter/jobs/{job_id}/', headers=self.headers_user_1).json()
+        self.assertEqual({key: job[key] for key in ('status', 'rows_done', 'rows_failed', 'pages')},
+                         {'status': 'done', 'rows_done': 3, 'rows_failed': 1, 'pages': 2})
+        self.assertIsNotNone(job['throughput'])
+
+        # Проверка страниц результатов
+        page_1 = self.client.get(f'/converter/jobs/{job_id}/results/', headers=self.headers_user_1).json()
+        self.assertEqual(page_1['next'], 2)
+        self.assertEqual([row['converted'] for row in page_1['results']], ['27.69', '0.13'])
+        page_2 = self.client.get(f'/converter/jobs/{job_id}/results/?page=2', headers=self.headers_user_1).json()
+        self.assertIsNone(page_2['next'])
+        self.assertEqual(page_2['results'][0]['error'], 'Пользователь не добавил текущую валюту для конвертации.')
+
+    def test_job_is_not_run_by_web_worker(self):
+        """Задача не выполняется в процессе веб-сервера: до обработки воркером она остается в очереди."""
+
+        response = self.submit()
+        self.assertEqual(response.json()['status'], 'pending')
+        self.assertEqual(response.json()['rows_done'], 0)
+
+        # Страниц результатов еще нет, чужая задача недоступна
+        job_id = response.json()['id']
+        response = self.client.get(f'/converter/jobs/{job_id}/results/', headers=self.headers_user_1)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(f'/converter/jobs/{job_id}/', headers=self.headers_user_2)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RateCacheTestCase(TestCase):
+    """Тестирование кэша курсов валют."""
+
+    def setUp(self) -> None:
+        self.rate_cache = RateCache(ttl=60, stale=60, prefix='test_currency_rate')
+        self.rate_cache.invalidate('USD', ['EUR', 'GBP'])
+        self.calls = []
+
+    def fetch(self):
+        self.calls.append(1)
+        return {'EUR': 0.9, 'GBP': 0.8}
+
+    def test_rate_cache_returns_cached_rates(self):
+        """Повторный запрос курсов для той же пары (<base>, <symbols>) не обращается к apilayer."""
+
+        # Первый запрос — промах, второй — попадание
+        self.rate_cache.get_or_fetch('USD', ['EUR', 'GBP'], self.fetch)
+        rates = self.rate_cache.get_or_fetch('usd', ['GBP', 'EUR'], self.fetch)
+
+        # Проверка курсов и количества обращений к apilayer
+        self.assertEqual(rates, {'EUR': 0.9, 'GBP': 0.8})
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.rate_cache.stats()['hits'], 1)
+        self.assertEqual(self.rate_cache.stats()['misses'], 1)
+
+    def test_rate_cache_serves_stale_rates_while_revalidating(self):
+        """Устаревшие курсы отдаются сразу, а обновление выполняется в фоне."""
+
+        # Запись в кэш курсов, полученных 90 секунд назад
+        key = self.rate_cache.make_key('USD', ['EUR', 'GBP'])
+        self.rate_cache.cache.set(key, {'rates': {'EUR': 1, 'GBP': 1}, 'fetched_at': time.time() - 90})
+
+        # Запрос возвращает устаревшие курсы
+        rates = self.rate_cache.get_or_fetch('USD', ['EUR', 'GBP'], self.fetch)
+        self.assertEqual(rates, {'EUR': 1, 'GBP': 1})
+        self.assertEqual(self.rate_cache.stats()['stale_hits'], 1)
+
+        # Ожидание фонового обновления
+        for thread in threading.enumerate():
+            if thread.name == 'rate-cache-revalidate':
+                thread.join()
+        self.assertEqual(self.rate_cache.cache.get(key)['rates'], {'EUR': 0.9, 'GBP': 0.8})
+
+    def test_rate_cache_does_not_store_empty_rates(self):
+        """Пустой ответ apilayer не кэшируется."""
+
+        self.rate_cache.get_or_fetch('USD', ['EUR', 'GBP'], lambda: None)
+        self.rate_cache.get_or_fetch('USD', ['EUR', 'GBP'], self.fetch)
+
+        self.assertEqual(self.rate_cache.stats()['misses'], 2)
+
+
+class RateProviderTestCase(TestCase):
+    """Тестирование клиента apilayer."""
+
+    def setUp(self) -> None:
+        self.provider = ApilayerRateProvider(url='https://example.com/latest', api_key='key', retries=2, backoff=0)
+
+    @staticmethod
+    def make_response(status_code, rates=None):
+        return mock.Mock(status_code=status_code, ok=status_code < 400, content=json.dumps({'rates': rates}).encode())
+
+    def test_rate_provider_retries_server_errors(self):
+        """Ответы 5xx повторяются, пока не будет получен корректный ответ."""
+
+        with mock.patch.object(requests.Session, 'get', side_effect=[
+            self.make_response(503), self.make_response(200, {'EUR': 0.9})
+        ]) as get:
+            rates = self.provider.get_rates('USD', ['EUR'])
+
+        # Проверка курсов, таймаутов и счетчиков
+        self.assertEqual(rates, {'EUR': Decimal('0.9')})
+        self.assertEqual(get.call_args.kwargs['timeout'], self.provider.timeout)
+        self.assertEqual(self.provider.stats()['requests'], 2)
+        self.assertEqual(self.provider.stats()['retries'], 1)
+        self.assertEqual(self.provider.stats()['errors'], 1)
+
+    def test_incomplete_rate_provider_cannot_be_created(self):
+        """Провайдер без асинхронного метода aget_rates не создается."""
+
+        class SyncOnlyRateProvider(BaseRateProvider):
+            def get_rates(self, base, symbols):
+                return {}
+
+        with self.assertRaises(TypeError):
+            SyncOnlyRateProvider()
+
+    def test_rate_provider_does_not_retry_client_errors(self):
+        """Ответы 4xx не повторяются."""
+
+        with mock.patch.object(requests.Session, 'get', return_value=self.make_response(401)) as get:
+            self.assertIsNone(self.provider.get_rates('USD', ['EUR']))
+        self.assertEqual(get.call_count, 1)
+
+    def test_rate_provider_gives_up_after_retries(self):
+        """После исчерпания повторов клиент возвращает None."""
+
+        with mock.patch.object(requests.Session, 'get', side_effect=requests.Timeout) as get:
+            self.assertIsNone(self.provider.get_rates('USD', ['EUR']))
+        self.assertEqual(get.call_count, 3)
+
+    def test_rate_provider_treats_non_json_response_as_failure(self):
+        """Ответ 200 с телом не в формате JSON (например, страница прокси) считается неудачной попыткой."""
+
+        response = mock.Mock(status_code=200, ok=True, content=b'<html>Service unavailable</html>')
+        with mock.patch.object(requests.Session, 'get', return_value=response) as get:
+            self.assertIsNone(self.provider.get_rates('USD', ['EUR']))
+
+        # Проверка количества запросов и счетчика ошибок
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(self.provider.stats()['errors'], 1)
+
+    def test_rate_provider_reuses_session(self):
+        """Сессия с пулом соединений создается один раз на процесс."""
+
+        self.assertIs(self.provider.session, self.provider.session)
+
+
+class RateMatrixTestCase(TestCase):
+    """Тестирование матрицы курсов валют."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.pivot_rates = {'USD': Decimal('1.08'), 'GBP': Decimal('0.86'), 'CNY': Decimal('7.8')}
+
+    def test_rate_matrix_derives_cross_rates(self):
+        """Кросс-курсы вычисляются через опорную валюту."""
+
+        matrix = RateMatrix('EUR', self.pivot_rates)
+
+        self.assertEqual(matrix.rate('EUR', 'USD'), Decimal('1.080000'))
+        self.assertEqual(matrix.rate('USD', 'EUR'), Decimal('0.925926'))
+        self.assertEqual(matrix.rate('usd', 'gbp'), Decimal('0.796296'))
+        self.assertEqual(set(matrix.rates_for('CNY')), {'EUR', 'USD', 'GBP'})
+
+    def test_get_currency_rate_uses_one_upstream_request(self):
+        """Курсы для всех базовых валют вычисляются по одному запросу к apilayer."""
+
+        with mock.patch('converter.services.fetch_currency_rate', return_value=self.pivot_rates) as fetch:
+            for code in ('GBP', 'USD', 'EUR', 'CNY'):
+                rates = get_currency_rate(code)
+                self.assertEqual(len(rates), 3)
+
+        # Проверка количества обращений к apilayer
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(fetch.call_args.args, ('EUR', ['CNY', 'GBP', 'USD']))
+
+
+class RefreshCurrencyRatesTestCase(ConverterModelTestCase):
+    """Тестирование периодического обновления курсов валют."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+
+        # Добавление снимков курсов базовых валют объектов Converter
+        for converter in (self.converter_1, self.converter_2):
+            snapshot = RateSnapshot.objects.create(base=converter.code, fetched_at=timezone.now())
+            for code in ('GBP', 'USD', 'EUR', 'CNY'):
+                if code != converter.code:
+                    CurrencyRate.objects.create(snapshot=snapshot, code=code, currency_rate=1)
+
+    def test_refresh_currency_rates_updates_all_converters(self):
+        """Курсы всех объектов Converter обновляются по одному запросу к apilayer."""
+
+        with mock.patch('converter.services.fetch_currency_rate', return_value={
+            'USD': Decimal('1.08'), 'GBP': Decimal('0.86'), 'CNY': Decimal('7.8')
+        }) as fetch:
+            updated = refresh_currency_rates.apply().get()
+
+        # Проверка количества обращений к apilayer и обновленных курсов
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(updated, 2)
+        self.converter_1.refresh_from_db()
+        self.converter_2.refresh_from_db()
+        self.assertEqual(self.converter_1.rates.get(code='EUR').currency_rate, Decimal('0.925926'))
+        self.assertEqual(self.converter_2.rates.get(code='USD').currency_rate, Decimal('1.080000'))
+
+    def test_refresh_saves_one_snapshot_per_base_without_updating_converters(self):
+        """Обновление курсов сохраняет по одному снимку на базовую валюту и не изменяет объекты Converter: объекты
+        с одной базовой валютой читают курсы из ее последнего снимка."""
+
+        converter_3 = Converter.objects.create(title='Доллар', code='USD', converter_user=self.user_2)
+        changed = self.converter_1.changed
+        with mock.patch('converter.services.fetch_currency_rate', return_value={
+            'USD': Decimal('1.08'), 'GBP': Decimal('0.86'), 'CNY': Decimal('7.8')
+        }), CaptureQueriesContext(connection) as queries:
+            refresh_currency_rates.apply().get()
+
+        # Проверка запросов: объекты Converter не обновляются
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE')])
+        self.converter_1.refresh_from_db()
+        self.assertEqual(self.converter_1.changed, changed)
+
+        # Проверка общего последнего снимка и количества сохраненных курсов
+        latest = RateSnapshot.objects.filter(base='USD').latest('fetched_at')
+        self.assertEqual(set(self.converter_1.rates), set(latest.rates.all()))
+        self.assertEqual(set(converter_3.rates), set(latest.rates.all()))
+        self.assertEqual(latest.rates.count(), 3)
+
+
+class AsyncRateProviderTestCase(TestCase):
+    """Тестирование асинхронного клиента apilayer."""
+
+    def test_async_rate_provider_retries_and_fetches_many_bases(self):
+        """Асинхронный клиент повторяет ответы 5xx и одновременно запрашивает несколько базовых валют."""
+
+        responses = iter([httpx.Response(503)] + [httpx.Response(200, content=b'{"rates": {"EUR": 0.925926}}')] * 3)
+        transport = httpx.MockTransport(lambda request: next(responses))
+        provider = ApilayerRateProvider(url='https://example.com/latest', api_key='key', retries=1, backoff=0,
+                                        transport=transport)
+
+        async def fetch():
+            first = await provider.aget_rates('USD', ['EUR'])
+            many = await provider.aget_many_rates([('GBP', ['EUR']), ('CNY', ['EUR'])])
+            await provider.aclose()
+            return first, many
+
+        first, many = asyncio.run(fetch())
+
+        # Проверка курсов и счетчиков
+        self.assertEqual(first, {'EUR': Decimal('0.925926')})
+        self.assertEqual(len(many), 2)
+        self.assertEqual(provider.stats()['requests'], 4)
+        self.assertEqual(provider.stats()['retries'], 1)
+
+    def test_async_rate_provider_treats_non_json_response_as_failure(self):
+        """Асинхронный клиент возвращает None на ответ 200 с телом не в формате JSON."""
+
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, content=b'<html>Bad gateway</html>'))
+        provider = ApilayerRateProvider(url='https://example.com/latest', api_key='key', transport=transport)
+
+        self.assertIsNone(asyncio.run(provider.aget_rates('USD', ['EUR'])))
+        self.assertEqual(provider.stats()['errors'], 1)
+
+    def test_async_client_is_closed_with_its_event_loop(self):
+        """Клиент переиспользуется в пределах цикла событий и закрывается при его остановке без явного aclose."""
+
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, content=b'{"rates": {"EUR": 1}}'))
+        provider = ApilayerRateProvider(url='https://example.com/latest', api_key='key', transport=transport)
+
+        async def fetch():
+            await provider.aget_many_rates([('GBP', ['EUR']), ('CNY', ['EUR'])])
+            return await provider.aget_client(), await provider.aget_client()
+
+        # Каждый вызов asyncio.run — отдельный цикл событий, как у async_to_sync под WSGI
+        first, same = asyncio.run(fetch())
+        second, _ = asyncio.run(fetch())
+
+        # Проверка переиспользования и закрытия клиентов
+        self.assertIs(first, same)
+        self.assertIsNot(first, second)
+        self.assertTrue(first.is_closed)
+        self.assertTrue(second.is_closed)
+        self.assertEqual(len(provider._clients), 0)
+
+
+@override_settings(RATE_PROVIDER_BACKEND='converter.providers.FakeRateProvider')
+class ConverterAsyncTestCase(ConverterModelTestCase):
+    """Тестирование асинхронных представлений модели Converter."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+
+    def test_user_can_create_and_convert_asynchronously(self):
+        """Авторизованные пользователи создают объекты Converter и конвертируют валюты через асинхронные
+        представления."""
+
+        # POST-запрос на создание объекта
+        response = self.client.post(
+            '/converter/async/create/',
+            {'title': 'Фунты', 'code': 'GBP', 'converter_user': 'test@test.com'},
+            headers=self.headers_user_1,
+            format='json'
+        )
+
+        # Проверка статус кода и количества курсов
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(CurrencyRate.objects.count(), 3)
+
+        # POST-запрос на конвертацию валют
+        response = self.client.post(
+            '/converter/async/get_rate/',
+            {'base_currency': 'GBP', 'target_currency': 'EUR', 'amount': '86'},
+            headers=self.headers_user_1,
+            format='json'
+        )
+
+        # Проверка содержимого ответа
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'converter': '86 GBP = 100.000026 EUR'})
+
+    def test_user_can_create_asynchronously_with_lowercase_code(self):
+        """Код валюты в нижнем регистре принимается так же, как в синхронном представлении."""
+
+        response = self.client.post(
+            '/converter/async/create/',
+            {'title': 'Фунты', 'code': 'gbp', 'converter_user': 'test@test.com'},
+            headers=self.headers_user_1,
+            format='json'
+        )
+
+        # Проверка статус кода и сохраненного кода валюты
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Converter.objects.filter(converter_user=self.user_test, code='GBP').exists())
+
+    def test_user_cannot_update_asynchronously_another_user(self):
+        """Авторизованные пользователи не могут изменять объекты Converter чужих пользователей."""
+
+        response = self.client.patch(
+            f'/converter/async/update/{self.converter_2.pk}/',
+            {'code': 'EUR'},
+            headers=self.headers_user_1,
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class RateStubServerTestCase(TestCase):
+    """Тестирование сервера-заглушки apilayer и фейкового провайдера."""
+
+    def start_server(self, **kwargs):
+        server = RateStubServer(('127.0.0.1', 0), **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_apilayer_provider_works_against_stub_server(self):
+        """Клиент apilayer получает от сервера-заглушки те же курсы, что и фейковый провайдер."""
+
+        server = self.start_server(latency=0.01, jitter=0.005, seed=1)
+        provider = ApilayerRateProvider(url=server.url, api_key='key', retries=0)
+
+        rates = provider.get_rates('EUR', ['USD', 'GBP'])
+
+        self.assertEqual(rates, FakeRateProvider(latency=0).get_rates('EUR', ['USD', 'GBP']))
+        self.assertGreaterEqual(provider.stats()['max_time'], 0.005)
+
+    def test_stub_server_returns_errors(self):
+        """При доле ошибок 1 клиент apilayer исчерпывает повторы и возвращает None."""
+
+        server = self.start_server(error_rate=1)
+        provider = ApilayerRateProvider(url=server.url, api_key='key', retries=1, backoff=0)
+
+        self.assertIsNone(provider.get_rates('EUR', ['USD']))
+        self.assertEqual(provider.stats()['errors'], 2)
+
+
+class SingleFlightTestCase(TestCase):
+    """Тестирование объединения одновременных запросов к apilayer."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.calls = []
+
+    def slow_fetch(self):
+        self.calls.append(1)
+        time.sleep(0.1)
+        return {'EUR': Decimal('0.9')}
+
+    def run_concurrently(self, target, count=10):
+        barrier = threading.Barrier(count)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(target())
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_rate_cache_coalesces_concurrent_misses(self):
+        """Одновременные промахи кэша по одному ключу приводят к одному запросу к apilayer."""
+
+        rate_cache = RateCache(ttl=60, stale=60, prefix='test_singleflight', flight=SingleFlight())
+        results = self.run_concurrently(lambda: rate_cache.get_or_fetch('USD', ['EUR'], self.slow_fetch))
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(results, [{'EUR': Decimal('0.9')}] * 10)
+
+    def test_redis_single_flight_shares_result_between_workers(self):
+        """Разные экземпляры RedisSingleFlight (воркеры) выполняют функцию один раз."""
+
+        flights = [RedisSingleFlight(poll_interval=0.01) for _ in range(5)]
+        results = self.run_concurrently(
+            lambda: flights[threading.get_ident() % 5].do('USD:EUR', self.slow_fetch)
+        )
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(len(results), 10)
+
+    def test_redis_single_flight_releases_only_own_lock(self):
+        """Владелец, чья блокировка истекла, не снимает блокировку, захваченную другим воркером."""
+
+        flight_1, flight_2 = RedisSingleFlight(), RedisSingleFlight()
+        lock_1, _ = flight_1._acquire('singleflight:lock:USD:EUR')
+
+        # Блокировка первого воркера истекла, и ее захватил второй
+        cache.delete('singleflight:lock:USD:EUR')
+        _, token_2 = flight_2._acquire('singleflight:lock:USD:EUR')
+        flight_1._release(lock_1)
+
+        self.assertEqual(flight_2._owner('singleflight:lock:USD:EUR'), token_2)
+
+    def test_redis_single_flight_ignores_previous_results(self):
+        """Результат прошлого запроса, еще хранящийся в кэше, не возвращается новому запросу."""
+
+        flight = RedisSingleFlight(poll_interval=0.01)
+        flight.do('USD:EUR', self.slow_fetch)
+        cache.set(flight.result_key('USD:EUR', 'previous'), {'EUR': Decimal('0.1')})
+
+        self.assertEqual(flight.do('USD:EUR', self.slow_fetch), {'EUR': Decimal('0.9')})
+        self.assertEqual(len(self.calls), 2)
+
+    def test_single_flight_coalesces_coroutines(self):
+        """Одновременные корутины с одним ключом ждут одну задачу."""
+
+        flight = SingleFlight()
+
+        async def afetch():
+            self.calls.append(1)
+            await asyncio.sleep(0.05)
+            return {'EUR': Decimal('0.9')}
+
+        async def run():
+            return await asyncio.gather(*(flight.ado('USD:EUR', afetch) for _ in range(10)))
+
+        results = asyncio.run(run())
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(len(results), 10)
+
+
+class CircuitBreakerTestCase(ConverterModelTestCase):
+    """Тестирование предохранителя провайдера курсов и отдачи последних сохраненных курсов."""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        # Сохраненные курсы второго пользователя
+        snapshot = RateSnapshot.objects.create(base='EUR', fetched_at=timezone.now())
+        for code in ('GBP', 'USD', 'CNY'):
+            CurrencyRate.objects.create(snapshot=snapshot, code=code, currency_rate=1)
+
+    def test_circuit_breaker_opens_and_probes(self):
+        """После порога неудач предохранитель размыкается, а по истечении таймаута пропускает пробный запрос."""
+
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        for _ in range(2):
+            breaker.call(lambda: None)
+        self.assertEqual(breaker.state, 'open')
+        with self.assertRaises(CircuitOpenError):
+            breaker.call(lambda: {'EUR': 1})
+
+        # Пробный запрос после таймаута замыкает предохранитель
+        time.sleep(0.06)
+        self.assertEqual(breaker.call(lambda: {'EUR': 1}), {'EUR': 1})
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_cancelled_probe_does_not_keep_breaker_open(self):
+        """Отмененный пробный запрос считается неудачей: после таймаута предохранитель снова пропускает запрос."""
+
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.call(lambda: None)
+        time.sleep(0.06)
+
+        async def probe():
+            task = asyncio.ensure_future(breaker.acall(lambda: asyncio.sleep(10)))
+            await asyncio.sleep(0)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(probe())
+        self.assertEqual(breaker.state, 'open')
+
+        # Следующий пробный запрос выполняется и замыкает предохранитель
+        time.sleep(0.06)
+        self.assertEqual(breaker.call(lambda: {'EUR': 1}), {'EUR': 1})
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_user_gets_last_known_rates_while_provider_is_down(self):
+        """Пока провайдер курсов недоступен, объект Converter создается с последними сохраненными курсами."""
+
+        provider = mock.Mock()
+        provider.get_rates.return_value = None
+
+        with mock.patch('converter.services.get_rate_provider', return_value=provider), \
+                mock.patch.object(rate_breaker, 'failure_threshold', 1):
+            responses = [
+                self.client.post(
+                    '/converter/create/',
+                    {'title': 'Евро', 'code': 'EUR', 'converter_user': email},
+                    headers=headers,
+                    format='json'
+                ) for email, headers in (('test@test.com', self.headers_user_1),
+                                         ('inactive@test.com', self.headers_user_inactive))
+            ]
+
+        # Проверка статус кода и возраста курсов
+        for response in responses:
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertIsNotNone(response.json().get('rates_age'))
+
+        # После размыкания предохранителя провайдер больше не вызывается
+        self.assertEqual(provider.get_rates.call_count, 1)
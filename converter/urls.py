@@ -2,13 +2,27 @@ from django.urls import path
 
 from converter.apps import ConverterConfig
 from converter.views import ConverterCreateAPIView, ConverterDetailAPIView, ConverterUpdateAPIView, \
-    ConverterGetCurrencyRateAPIView
+    ConverterGetCurrencyRateAPIView, ConverterAsyncCreateAPIView, ConverterAsyncUpdateAPIView, \
+    ConverterAsyncGetCurrencyRateAPIView, ConverterGetCurrencyRateBatchAPIView, ConverterGetCurrencyRateMatrixAPIView, \
+    RateHistoryAPIView, ConverterBulkConvertAPIView, ConversionJobCreateAPIView, ConversionJobDetailAPIView, \
+    ConversionJobResultsAPIView, ConverterListAPIView
 
 app_name = ConverterConfig.name
 
 urlpatterns = [
+    path('', ConverterListAPIView.as_view(), name='list_converter'),
     path('create/', ConverterCreateAPIView.as_view(), name='create_converter'),
     path('<int:pk>/', ConverterDetailAPIView.as_view(), name='detail_converter'),
     path('update/<int:pk>/', ConverterUpdateAPIView.as_view(), name='update_converter'),
-    path('get_rate/', ConverterGetCurrencyRateAPIView.as_view(), name='get_rate_converter')
+    path('get_rate/', ConverterGetCurrencyRateAPIView.as_view(), name='get_rate_converter'),
+    path('get_rate/batch/', ConverterGetCurrencyRateBatchAPIView.as_view(), name='get_rate_batch_converter'),
+    path('get_rate/matrix/', ConverterGetCurrencyRateMatrixAPIView.as_view(), name='get_rate_matrix_converter'),
+    path('convert/bulk/', ConverterBulkConvertAPIView.as_view(), name='bulk_convert_converter'),
+    path('jobs/', ConversionJobCreateAPIView.as_view(), name='create_conversion_job'),
+    path('jobs/<int:pk>/', ConversionJobDetailAPIView.as_view(), name='detail_conversion_job'),
+    path('jobs/<int:pk>/results/', ConversionJobResultsAPIView.as_view(), name='results_conversion_job'),
+    path('history/', RateHistoryAPIView.as_view(), name='rate_history'),
+    path('async/create/', ConverterAsyncCreateAPIView.as_view(), name='async_create_converter'),
+    path('async/update/<int:pk>/', ConverterAsyncUpdateAPIView.as_view(), name='async_update_converter'),
+    path('async/get_rate/', ConverterAsyncGetCurrencyRateAPIView.as_view(), name='async_get_rate_converter'),
 ]
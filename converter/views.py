@@ -1,13 +1,31 @@
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from django.db import transaction
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from rest_framework import generics
+from rest_framework.filters import OrderingFilter
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
 from rest_framework.views import APIView
 
-from converter.models import Converter
+from converter.bulk import RENDERERS, convert_rows, read_rows
+from converter.history import downsample_rate_history, get_rate_series
+from converter.models import ConversionJob, ConversionJobChunk, Converter, prefetch_rates
+from converter.paginators import ConverterCursorPagination
+from converter.payloads import converter_payload, converter_rows, snapshot_rates
 from converter.permissions import IsActiveAndIsOwner
 from converter.serializers import ConverterSerializer, ConverterDetailSerializer, ConverterUpdateSerializer, \
-    ConverterGetCurrencyRate
+    ConverterGetCurrencyRate, ConverterGetCurrencyRateBatch, ConverterGetCurrencyRateMatrix, RateHistorySerializer, \
+    ConverterBulkConvertSerializer, ConversionJobSerializer, ConverterListSerializer
+from converter.rate_table import rate_table
+from converter.services import aget_currency_rate
+from converter.tasks import run_conversion_job
+from users.authentication import StatelessJWTAuthentication
 
 
 # Create your views here.
@@ -24,19 +42,79 @@ class ConverterCreateAPIView(generics.CreateAPIView):
         converter_user_from_user = serializer.validated_data.get('converter_user')
         if converter_user_from_user != self.request.user:
             raise ValidationError({"converter_user": "Вы указали чужого пользователя."})
-        new_mat = serializer.save()
-        if not self.request.user.is_staff:
-            new_mat.converter_user = self.request.user
-        new_mat.save()
+        serializer.save(converter_user=self.request.user)
 
 
 class ConverterDetailAPIView(generics.RetrieveAPIView):
-    """Для получения детальной информации объектов модели Converter."""
+    """Для получения детальной информации объектов модели Converter. ETag и Last-Modified вычисляются по полям
+    <pk>, <changed> и последнему снимку курсов базовой валюты: если ни объект, ни курсы не изменились, то владельцу
+    возвращается 304 без загрузки курсов и сериализации.
+    Владельцу ответ собирается из строки values() без ConverterDetailSerializer (см. converter/payloads.py)."""
 
     serializer_class = ConverterDetailSerializer
     queryset = Converter.objects.all()
     permission_classes = (IsActiveAndIsOwner,)
 
+    def get(self, request, *args, **kwargs):
+        # Получение объекта вместе с почтой владельца одним запросом
+        row = converter_rows(Converter.objects.filter(pk=kwargs['pk'])).first()
+        if row is None or row['converter_user_id'] != request.user.pk:
+            return super().get(request, *args, **kwargs)
+
+        changed = max(row['changed'], row['rates_fetched_at'] or row['changed'])
+        etag = quote_etag(f'{kwargs["pk"]}-{row["changed"].timestamp():.6f}-{row["rates_snapshot_id"]}')
+        last_modified = int(changed.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = Response(converter_payload(row, snapshot_rates([row['rates_snapshot_id']])))
+        response.headers.setdefault('ETag', etag)
+        response.headers.setdefault('Last-Modified', http_date(last_modified))
+        return response
+
+
+class ConverterListAPIView(generics.ListAPIView):
+    """Для получения списка объектов модели Converter текущего пользователя с постраничным выводом по курсору.
+    Параметр <fields> (например, ?fields=id,code,rate) ограничивает выбираемые из базы данных поля, курсы
+    загружаются одним дополнительным запросом, только если запрошено поле <rate>."""
+
+    serializer_class = ConverterListSerializer
+    pagination_class = ConverterCursorPagination
+    permission_classes = (IsAuthenticated,)
+    filter_backends = (OrderingFilter,)
+    ordering_fields = ('created', 'changed')
+
+    def get_fields(self):
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return None
+        fields = {field.strip() for field in fields.split(',')} & set(ConverterListSerializer.Meta.fields)
+        if not fields:
+            raise ValidationError({'fields': 'Необходимо указать хотя бы одно поле из списка: '
+                                             f'{", ".join(ConverterListSerializer.Meta.fields)}.'})
+        return fields
+
+    def get_queryset(self):
+        fields = self.get_fields() or set(ConverterListSerializer.Meta.fields)
+        queryset = Converter.objects.filter(converter_user=self.request.user)
+
+        # Поля сортировки нужны пагинации по курсору, поэтому выбираются всегда
+        columns = {'id', 'created', 'changed'} | (fields & {'title', 'code'})
+        if 'converter_user' in fields:
+            queryset = queryset.select_related('converter_user')
+            columns |= {'converter_user__email'}
+        if 'rate' in fields:
+            queryset = queryset.with_rates_snapshot()
+        return queryset.only(*columns)
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None and 'rate' in (self.get_fields() or ConverterListSerializer.Meta.fields):
+            page = prefetch_rates(page)
+        return page
+
+    def get_serializer(self, *args, **kwargs):
+        return super().get_serializer(*args, fields=self.get_fields(), **kwargs)
+
 
 class ConverterUpdateAPIView(generics.UpdateAPIView):
     """Для изменения детальной информации объектов модели Converter."""
@@ -50,19 +128,15 @@ class ConverterUpdateAPIView(generics.UpdateAPIView):
         пользователь введет другого пользователя в поле <converter_user>, то возбудится исключение."""
 
         code_from_user = serializer.validated_data.get('code')
-        converter_by_user = Converter.objects.filter(code=code_from_user.upper(),
-                                                     converter_user=self.request.user).first()
-        if not converter_by_user:
+        if code_from_user.upper() != serializer.instance.code:
             raise ValidationError({"wrong_code": "Вы не добавляли валюту для конвертации."})
-        new_mat = serializer.save()
-        if not self.request.user.is_staff:
-            new_mat.converter_user = self.request.user
-        new_mat.save()
+        serializer.save()
 
 
 class ConverterGetCurrencyRateAPIView(APIView):
     """Для получения конвертации курса валют, полученных от пользователя."""
     permission_classes = (IsActiveAndIsOwner,)
+    authentication_classes = (StatelessJWTAuthentication,)
 
     def post(self, request):
         serializer = ConverterGetCurrencyRate(data=request.data)
@@ -73,23 +147,306 @@ class ConverterGetCurrencyRateAPIView(APIView):
             target_currency = request.data.get('target_currency')
             amount = request.data.get('amount')
 
-            # Получение объекта с курсами валют, созданного пользователем
-            user_converter = Converter.objects.filter(code=base_currency.upper(), converter_user=request.user).first()
+            # Получение курса из таблицы курсов пользователя
+            rate = rate_table.get(request.user.pk, base_currency, target_currency)
 
-            # Если объекта с курсами валют нет, то вернется сообщение об этом с 400 статус кодом
-            if not user_converter:
+            # Если пользователь не добавил валюту для конвертации, то вернется сообщение об этом с 400 статус кодом
+            if rate is None:
                 return Response({'converter_user': 'Пользователь не добавил текущую валюту для конвертации.'},
                                 status=400)
 
-            # Получение объекта с курсами валют из базы данных
-            rate_data = user_converter.rate.get(code=target_currency.upper())
-
-            # Если объекта с курсами валют из базы данных нет, то вернется сообщение об этом с 400 статус кодом
-            if not rate_data:
-                return Response({'converter_user': 'Пользователь не добавил текущую валюту для конвертации.'},
-                                status=400)
+            # Получение курса, действовавшего в указанный момент
+            as_of = serializer.validated_data.get('as_of')
+            if as_of is not None:
+                rate = get_rate_series(base_currency, target_currency).rate_at(as_of)
+                if rate is None:
+                    return Response({'as_of': 'Нет курса валют на указанный момент.'}, status=400)
 
             # Конвертация валюты
-            result = rate_data.currency_rate * int(amount)
+            result = rate * int(amount)
             return Response({'converter': f'{amount} {base_currency} = {result} {target_currency}'})
         return Response(serializer.errors, status=400)
+
+
+class ConverterGetCurrencyRateBatchAPIView(APIView):
+    """Для пакетной конвертации курса валют, полученных от пользователя. Курсы для всех конвертаций берутся из
+    таблицы курсов пользователя, результаты возвращаются в порядке запроса. Ошибки возвращаются для каждой
+    конвертации отдельно."""
+    permission_classes = (IsActiveAndIsOwner,)
+    authentication_classes = (StatelessJWTAuthentication,)
+
+    def post(self, request):
+        serializer = ConverterGetCurrencyRateBatch(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        # Валидация каждой конвертации
+        items = [ConverterGetCurrencyRate(data=data) for data in serializer.validated_data['conversions']]
+        valid_items = [item.validated_data for item in items if item.is_valid()]
+
+        # Получение таблицы курсов пользователя для всех конвертаций
+        rates = rate_table.get_table(request.user.pk) if valid_items else {}
+
+        # Курсы на указанные моменты ищутся за один проход по ряду курсов каждой пары валют
+        moments = {}
+        for data in valid_items:
+            pair = (data['base_currency'].upper(), data['target_currency'].upper())
+            if data.get('as_of') is not None and pair in rates:
+                moments.setdefault(pair, []).append(data['as_of'])
+        historical_rates = {
+            pair: iter(get_rate_series(*pair).rates_at(pair_moments)) for pair, pair_moments in moments.items()
+        }
+
+        results = []
+        for item in items:
+            if item.errors:
+                results.append({'errors': item.errors})
+                continue
+
+            # Получение переменных
+            base_currency = item.validated_data['base_currency']
+            target_currency = item.validated_data['target_currency']
+            amount = item.validated_data['amount']
+            pair = (base_currency.upper(), target_currency.upper())
+
+            # Если курса валют нет, то для текущей конвертации вернется сообщение об этом
+            rate = rates.get(pair)
+            if rate is None:
+                results.append({'errors': {
+                    'converter_user': 'Пользователь не добавил текущую валюту для конвертации.'
+                }})
+                continue
+            if item.validated_data.get('as_of') is not None:
+                rate = next(historical_rates[pair])
+                if rate is None:
+                    results.append({'errors': {'as_of': 'Нет курса валют на указанный момент.'}})
+                    continue
+
+            # Конвертация валюты
+            results.append({'converter': f'{amount} {base_currency} = {rate * amount} {target_currency}'})
+        return Response({'results': results})
+
+
+class ConverterGetCurrencyRateMatrixAPIView(APIView):
+    """Для конвертации одной или нескольких сумм из базовой валюты во все актуальные валюты. Курсы берутся из
+    таблицы курсов пользователя."""
+    permission_classes = (IsActiveAndIsOwner,)
+    authentication_classes = (StatelessJWTAuthentication,)
+
+    def post(self, request):
+        serializer = ConverterGetCurrencyRateMatrix(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        # Получение переменных
+        base_currency = serializer.validated_data['base_currency'].upper()
+        amounts = serializer.validated_data['amounts']
+
+        # Получение курсов валют объекта, созданного пользователем
+        rates = {key: rate for key, rate in rate_table.get_table(request.user.pk).items() if key[0] == base_currency}
+
+        # Если объекта с курсами валют нет, то вернется сообщение об этом с 400 статус кодом
+        if not rates:
+            return Response({'converter_user': 'Пользователь не добавил текущую валюту для конвертации.'},
+                            status=400)
+
+        # Конвертация каждой суммы во все валюты
+        rates = {target: rate for (_, target), rate in sorted(rates.items())}
+        matrix = [
+            {'amount': amount, 'converted': {target: str(rate * amount) for target, rate in rates.items()}}
+            for amount in amounts
+        ]
+        return Response({'base_currency': base_currency, 'targets': list(rates), 'matrix': matrix})
+
+
+class ConverterBulkConvertAPIView(APIView):
+    """Для конвертации загруженного файла csv или ndjson со строками base_currency, target_currency, amount. Файл
+    читается построчно, строки конвертируются пачками по курсам пользователя, загруженным один раз, а результат
+    отдается потоком в том же формате. Память не зависит от размера файла."""
+    permission_classes = (IsActiveAndIsOwner,)
+    authentication_classes = (StatelessJWTAuthentication,)
+    parser_classes = (MultiPartParser,)
+
+    def post(self, request):
+        serializer = ConverterBulkConvertSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        # Получение переменных
+        file = serializer.validated_data['file']
+        input_format = serializer.validated_data['input_format']
+        render, content_type = RENDERERS[input_format]
+
+        # Курсы пользователя загружаются до начала потоковой отдачи
+        rates = rate_table.get_table(request.user.pk)
+        chunks = convert_rows(read_rows(file, input_format), rates)
+        return StreamingHttpResponse(render(chunks), content_type=content_type)
+
+
+class ConversionJobCreateAPIView(APIView):
+    """Для запуска фоновой конвертации загруженного файла csv или ndjson. Файл обрабатывается воркером Celery,
+    в ответ сразу возвращается идентификатор задачи со статусом 202."""
+    permission_classes = (IsAuthenticated,)
+    parser_classes = (MultiPartParser,)
+
+    def post(self, request):
+        serializer = ConverterBulkConvertSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        job = ConversionJob.objects.create(user=request.user, file=serializer.validated_data['file'],
+                                           input_format=serializer.validated_data['input_format'])
+
+        # Задача ставится в очередь после фиксации транзакции, чтобы воркер увидел созданный объект
+        transaction.on_commit(lambda: run_conversion_job.delay(job.pk))
+        return Response(ConversionJobSerializer(job).data, status=202)
+
+
+class ConversionJobDetailAPIView(generics.RetrieveAPIView):
+    """Для получения состояния фоновой конвертации: количество обработанных строк и скорость обработки."""
+
+    serializer_class = ConversionJobSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return ConversionJob.objects.filter(user=self.request.user)
+
+
+class ConversionJobResultsAPIView(APIView):
+    """Для постраничного получения результатов фоновой конвертации. Страница — одна сохраненная пачка строк."""
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, pk):
+        job = get_object_or_404(ConversionJob.objects.only('id', 'status', 'chunks'), pk=pk, user=request.user)
+        try:
+            page = int(request.query_params.get('page', 1))
+        except ValueError:
+            page = 0
+        if page < 1:
+            return Response({'page': 'Номер страницы должен быть положительным числом.'}, status=400)
+
+        rows = ConversionJobChunk.objects.filter(job=job, index=page - 1).values_list('rows', flat=True).first()
+        if rows is None:
+            return Response({'detail': 'Страница результатов еще не готова или не существует.'}, status=404)
+        return Response({
+            'page': page,
+            'pages': job.chunks,
+            'status': job.status,
+            'next': page + 1 if page < job.chunks else None,
+            'results': rows,
+        })
+
+
+class RateHistoryAPIView(APIView):
+    """Для получения истории курса валют за период. История прореживается на стороне базы данных: для каждого
+    интервала возвращаются минимальный, максимальный и последний курс."""
+    permission_classes = (IsAuthenticated,)
+    authentication_classes = (StatelessJWTAuthentication,)
+
+    def get(self, request):
+        serializer = RateHistorySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        # Получение переменных
+        base = serializer.validated_data['base'].upper()
+        target = serializer.validated_data['target'].upper()
+        interval = serializer.validated_data['interval']
+
+        points = downsample_rate_history(base, target, serializer.validated_data['start'],
+                                         serializer.validated_data['end'], interval)
+        return Response({
+            'base': base,
+            'target': target,
+            'interval': interval,
+            'points': [
+                {'bucket': point['bucket'], 'min': str(point['min']), 'max': str(point['max']),
+                 'last': str(point['last']), 'count': point['count']}
+                for point in points
+            ]
+        })
+
+
+class ConverterAsyncCreateAPIView(AsyncAPIView):
+    """Асинхронный вариант ConverterCreateAPIView для запуска под ASGI. Курсы валют запрашиваются у apilayer без
+    блокировки потока воркера."""
+
+    permission_classes = (IsAuthenticated,)
+
+    async def post(self, request):
+        serializer = ConverterSerializer(data=request.data)
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+
+        # Если пользователь введет другого пользователя в поле <converter_user>, то возбудится исключение
+        if serializer.validated_data.get('converter_user') != request.user:
+            raise ValidationError({"converter_user": "Вы указали чужого пользователя."})
+
+        rates_data = await aget_currency_rate(serializer.validated_data.get('code').upper())
+        await sync_to_async(serializer.save)(rates_data=rates_data)
+        return Response(serializer.data, status=201)
+
+
+class ConverterAsyncUpdateAPIView(AsyncAPIView):
+    """Асинхронный вариант ConverterUpdateAPIView для запуска под ASGI."""
+
+    permission_classes = (IsActiveAndIsOwner,)
+
+    async def get_object(self, pk):
+        converter = await aget_object_or_404(Converter.objects.select_related('converter_user'), pk=pk)
+        self.check_object_permissions(self.request, converter)
+        return converter
+
+    async def put(self, request, pk):
+        return await self.update(request, pk, partial=False)
+
+    async def patch(self, request, pk):
+        return await self.update(request, pk, partial=True)
+
+    async def update(self, request, pk, partial):
+        instance = await self.get_object(pk)
+        serializer = ConverterUpdateSerializer(instance, data=request.data, partial=partial)
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+
+        # Если пользователь не добавлял валюту для конвертации, то возбудится исключение
+        code_from_user = serializer.validated_data.get('code')
+        if code_from_user.upper() != instance.code:
+            raise ValidationError({"wrong_code": "Вы не добавляли валюту для конвертации."})
+
+        rates_data = await aget_currency_rate(instance.code)
+        await sync_to_async(serializer.save)(rates_data=rates_data)
+        return Response(serializer.data)
+
+
+class ConverterAsyncGetCurrencyRateAPIView(AsyncAPIView):
+    """Асинхронный вариант ConverterGetCurrencyRateAPIView, использующий асинхронный ORM Django."""
+    permission_classes = (IsActiveAndIsOwner,)
+    authentication_classes = (StatelessJWTAuthentication,)
+
+    async def post(self, request):
+        serializer = ConverterGetCurrencyRate(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        # Получение переменных
+        base_currency = request.data.get('base_currency')
+        target_currency = request.data.get('target_currency')
+        amount = request.data.get('amount')
+
+        # Получение курса из таблицы курсов пользователя
+        rate = await rate_table.aget(request.user.pk, base_currency, target_currency)
+
+        # Если пользователь не добавил валюту для конвертации, то вернется сообщение об этом с 400 статус кодом
+        if rate is None:
+            return Response({'converter_user': 'Пользователь не добавил текущую валюту для конвертации.'},
+                            status=400)
+
+        # Получение курса, действовавшего в указанный момент
+        as_of = serializer.validated_data.get('as_of')
+        if as_of is not None:
+            rate = (await sync_to_async(get_rate_series)(base_currency, target_currency)).rate_at(as_of)
+            if rate is None:
+                return Response({'as_of': 'Нет курса валют на указанный момент.'}, status=400)
+
+        # Конвертация валюты
+        result = rate * int(amount)
+        return Response({'converter': f'{amount} {base_currency} = {result} {target_currency}'})
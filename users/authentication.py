@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+# Признаки пользователя, которые записываются в токен при выдаче (см. users.serializers.UserTokenObtainPairSerializer)
+USER_CLAIMS = ('is_active', 'is_staff', 'is_superuser')
+
+
+class ClaimsTokenUser(TokenUser):
+    """Пользователь, построенный по подписанным признакам токена без запроса к базе данных. Идентификатор
+    приводится к типу первичного ключа User, поэтому request.user.pk можно сравнивать с внешними ключами."""
+
+    @property
+    def id(self):
+        return get_user_model()._meta.pk.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+    @property
+    def is_active(self):
+        return self.token.get('is_active', False)
+
+
+class VerifiedTokenCache:
+    """LRU уже проверенных токенов {raw_token: (user, validated_token)}. Повторный запрос с тем же токеном не
+    проверяет подпись и не декодирует JSON, но истекший токен из кэша не возвращается."""
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize or settings.JWT_STATELESS_CACHE_SIZE
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, raw_token):
+        with self._lock:
+            entry = self._entries.get(raw_token)
+            if entry is None:
+                return None
+            if entry[1].get('exp', 0) <= time.time():
+                del self._entries[raw_token]
+                return None
+            self._entries.move_to_end(raw_token)
+            return entry
+
+    def set(self, raw_token, user, validated_token):
+        with self._lock:
+            self._entries[raw_token] = (user, validated_token)
+            self._entries.move_to_end(raw_token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+verified_tokens = VerifiedTokenCache()
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """Аутентификация по JWT без запроса пользователя к базе данных: id, is_active, is_staff и is_superuser
+    берутся из подписанных признаков токена, записанных при его выдаче. Изменения пользователя вступают в силу
+    после получения нового токена. Токены, выданные без этих признаков, проверяются по базе данных как в
+    JWTAuthentication."""
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        entry = verified_tokens.get(raw_token)
+        if entry is not None:
+            return entry
+
+        # Пользователи, загруженные из базы данных, не кэшируются, чтобы не пропустить их изменения
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_user(validated_token)
+        if isinstance(user, ClaimsTokenUser):
+            verified_tokens.set(raw_token, user, validated_token)
+        return user, validated_token
+
+    def get_user(self, validated_token):
+        claims = (api_settings.USER_ID_CLAIM, *USER_CLAIMS)
+        if not all(claim in validated_token for claim in claims):
+            return super().get_user(validated_token)
+
+        user = ClaimsTokenUser(validated_token)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
@@ -0,0 +1,27 @@
+import hashlib
+
+from django.core.cache import cache
+
+VERSION_KEY = 'user_list:version'
+
+
+def user_list_version():
+    return cache.get_or_set(VERSION_KEY, 1, None)
+
+
+def user_list_key(request):
+    """Функция возвращает ключ кэша страницы списка пользователей. Ссылки на аватарки и следующую страницу
+    абсолютные, поэтому в ключ входят схема и хост, а параметры запроса сортируются."""
+
+    query = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+    url = f'{request.scheme}://{request.get_host()}{request.path}?{query}'
+    return f'user_list:{user_list_version()}:{hashlib.md5(url.encode()).hexdigest()}'
+
+
+def invalidate_user_list():
+    """Функция делает устаревшими все закэшированные страницы списка пользователей, увеличивая версию ключей."""
+
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
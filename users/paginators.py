@@ -0,0 +1,11 @@
+from rest_framework.pagination import CursorPagination
+
+
+class UserCursorPagination(CursorPagination):
+    """Постраничный вывод пользователей по курсору по уникальному полю <email>: в памяти находится не больше
+    одной страницы, сколько бы пользователей ни было."""
+
+    ordering = 'email'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
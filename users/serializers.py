@@ -1,17 +1,38 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
+from users.authentication import USER_CLAIMS
 from users.models import User
 
 
 class UserListSerializer(serializers.ModelSerializer):
+    """Для списка пользователей. Параметр <fields> ограничивает набор полей."""
+
     class Meta:
         model = User
         fields = ('id', 'email', 'first_name', 'city', 'avatar')
         ref_name = 'UserListSerializer'
 
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'email', 'first_name', 'last_name', 'city', 'phone', 'avatar')
         ref_name = 'UserSerializer'
+
+
+class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Для выдачи токенов. В токены записываются признаки пользователя для StatelessJWTAuthentication."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
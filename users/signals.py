@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.cache import invalidate_user_list
+from users.models import User
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_user_list_cache(sender, **kwargs):
+    """После сохранения или удаления пользователя закэшированные страницы списка пользователей устаревают."""
+
+    transaction.on_commit(invalidate_user_list)
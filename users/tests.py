@@ -1,7 +1,15 @@
+from unittest import mock
+
 from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import RefreshToken
 
+from users.authentication import ClaimsTokenUser, StatelessJWTAuthentication, verified_tokens
 from users.models import User
 
 
@@ -449,3 +457,118 @@ class UserActionTestCase(UserModelTestCase):
             response.json(),
             {'detail': 'У вас недостаточно прав для выполнения данного действия.'}
         )
+
+
+class UserListTestCase(UserModelTestCase):
+    """Тестирование списка пользователей."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+
+        # Получение маршрутов
+        self.user_list_url = '/user/'
+
+    def get_list(self, url=None, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url or self.user_list_url, params, headers=self.headers_user_1)
+        return response, len(queries)
+
+    def test_user_list_is_paginated(self):
+        """Список выводится постранично по курсору в порядке электронной почты."""
+
+        emails, url = [], None
+        while True:
+            response, _ = self.get_list(url, page_size=1) if url is None else self.get_list(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            emails.extend(user['email'] for user in response.json()['results'])
+            url = response.json()['next']
+            if url is None:
+                break
+        self.assertEqual(emails, ['another@test.com', 'inactive@test.com', 'test@test.com'])
+
+    def test_user_list_fields(self):
+        """Параметр fields ограничивает поля ответа и выбираемые из базы данных поля."""
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.user_list_url, {'fields': 'id,email'}, headers=self.headers_user_1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'email'})
+        self.assertFalse(any('"users_user"."avatar"' in query['sql'] and 'ORDER BY' in query['sql']
+                             for query in queries))
+
+        response, _ = self.get_list(fields='password')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_user_list_is_cached_until_user_saved(self):
+        """Повторный запрос страницы не обращается к таблице пользователей, кроме аутентификации. После сохранения
+        пользователя страница строится заново."""
+
+        response, queries_first = self.get_list()
+        response, queries_cached = self.get_list()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLess(queries_cached, queries_first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user_2.city = 'Москва'
+            self.user_2.save()
+
+        response, queries_after_save = self.get_list()
+        self.assertEqual(queries_after_save, queries_first)
+        self.assertEqual(response.json()['results'][0]['city'], 'Москва')
+
+    def test_anonymous_user_cannot_get_user_list(self):
+        """Анонимные пользователи не получают список пользователей."""
+
+        response = self.client.get(self.user_list_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class StatelessJWTAuthenticationTestCase(UserModelTestCase):
+    """Тестирование аутентификации по признакам токена без запроса пользователя к базе данных."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        verified_tokens.clear()
+        self.authentication = StatelessJWTAuthentication()
+        self.factory = APIRequestFactory()
+
+    def authenticate(self, headers):
+        return self.authentication.authenticate(self.factory.get('/', headers=headers))
+
+    def test_token_contains_user_claims(self):
+        """При выдаче в токен записываются id, is_active, is_staff и is_superuser пользователя."""
+
+        with self.assertNumQueries(0):
+            user, token = self.authenticate(self.headers_user_1)
+        self.assertIsInstance(user, ClaimsTokenUser)
+        self.assertEqual(user.pk, self.user_test.pk)
+        self.assertEqual((token['is_active'], token['is_staff'], token['is_superuser']), (True, False, False))
+
+    def test_verified_token_is_cached(self):
+        """Повторный запрос с тем же токеном не проверяет подпись заново."""
+
+        self.authenticate(self.headers_user_1)
+        with mock.patch.object(StatelessJWTAuthentication, 'get_validated_token') as get_validated_token:
+            user, _ = self.authenticate(self.headers_user_1)
+        get_validated_token.assert_not_called()
+        self.assertEqual(user.pk, self.user_test.pk)
+
+    def test_inactive_claim_is_rejected(self):
+        """Токен с признаком is_active=False не принимается."""
+
+        token = RefreshToken.for_user(self.user_test).access_token
+        for claim, value in (('is_active', False), ('is_staff', False), ('is_superuser', False)):
+            token[claim] = value
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate({'Authorization': f'Bearer {token}'})
+
+    def test_token_without_claims_uses_database(self):
+        """Токены, выданные без признаков пользователя, проверяются по базе данных и не кэшируются."""
+
+        token = RefreshToken.for_user(self.user_test).access_token
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate({'Authorization': f'Bearer {token}'})
+        self.assertIsInstance(user, User)
+        with self.assertNumQueries(1):
+            self.authenticate({'Authorization': f'Bearer {token}'})
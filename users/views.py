@@ -1,13 +1,49 @@
+from django.conf import settings
+from django.core.cache import cache
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.serializers import ValidationError
 
+from users.cache import user_list_key
 from users.models import User
+from users.paginators import UserCursorPagination
 from users.serializers import UserListSerializer
 
 
 # Create your views here.
 class UserListAPIView(generics.ListAPIView):
-    """Для получения объектов модели User."""
+    """Для получения объектов модели User с постраничным выводом по курсору. Параметр <fields> (например,
+    ?fields=id,email) ограничивает выбираемые из базы данных поля. Страницы кэшируются на короткое время и
+    устаревают при сохранении или удалении пользователей."""
+
     queryset = User.objects.all()
     serializer_class = UserListSerializer
+    pagination_class = UserCursorPagination
     permission_classes = (IsAuthenticated,)
+
+    def get_fields(self):
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return None
+        fields = {field.strip() for field in fields.split(',')} & set(UserListSerializer.Meta.fields)
+        if not fields:
+            raise ValidationError({'fields': 'Необходимо указать хотя бы одно поле из списка: '
+                                             f'{", ".join(UserListSerializer.Meta.fields)}.'})
+        return fields
+
+    def get_queryset(self):
+        # Поле сортировки нужно пагинации по курсору, поэтому выбирается всегда
+        fields = self.get_fields() or set(UserListSerializer.Meta.fields)
+        return super().get_queryset().only(*fields | {'id', 'email'})
+
+    def get_serializer(self, *args, **kwargs):
+        return super().get_serializer(*args, fields=self.get_fields(), **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        key = user_list_key(request)
+        data = cache.get(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(key, data, settings.USER_LIST_CACHE_TIMEOUT)
+        return Response(data)